@@ -0,0 +1,128 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any
+
+POSTER_NAME = "poster.jpg"
+
+class ArtworkCache:
+    """Downloads posters into a content-addressed store and links them beside library items."""
+
+    def __init__(self, store_dir: str, logger: Optional[logging.Logger] = None, workers: int = 4, timeout: int = 10):
+        self.store_dir = store_dir
+        self.logger = logger or logging.getLogger("artwork_cache")
+        self.timeout = timeout
+        self.index_path = os.path.join(store_dir, "index.json")
+
+        os.makedirs(store_dir, exist_ok=True)
+        self.index: Dict[str, str] = self._load_index()  # poster URL -> stored blob path
+
+        self._lock = threading.Lock()
+        self._downloads: Dict[str, Future] = {}  # imdbID and URL -> download future
+        self._placing = set()  # poster paths already queued this run
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="artwork")
+
+    def _load_index(self) -> Dict[str, str]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable artwork index: {str(e)}")
+            return {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def submit(self, destination_path: str, metadata: Dict[str, Any], is_tv: bool) -> Optional[Future]:
+        """Queue poster placement for a moved item; returns immediately."""
+        url = metadata.get("Poster")
+        if not url or url == "N/A":
+            return None
+
+        # Episodes share one poster at the show level; movies get one per folder
+        item_dir = os.path.dirname(destination_path)
+        poster_dir = os.path.dirname(item_dir) if is_tv else item_dir
+        poster_path = os.path.join(poster_dir, POSTER_NAME)
+        if os.path.exists(poster_path):
+            return None
+
+        key = metadata.get("imdbID") or url
+        with self._lock:
+            if poster_path in self._placing:
+                return None
+            self._placing.add(poster_path)
+            future = self._downloads.get(key) or self._downloads.get(url)
+            if future is None:
+                future = self._executor.submit(self._fetch, url)
+            else:
+                self.logger.debug(f"Reusing artwork download for {key}")
+            self._downloads[key] = self._downloads[url] = future
+
+        future.add_done_callback(lambda f: self._place(f, key, poster_path))
+        return future
+
+    def _fetch(self, url: str) -> str:
+        """Return the stored blob path for a poster URL, downloading it if needed."""
+        with self._lock:
+            blob_path = self.index.get(url)
+        if blob_path and os.path.exists(blob_path):
+            return blob_path
+
+        self.logger.debug(f"Downloading artwork: {url}")
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        content = response.content
+
+        digest = hashlib.sha256(content).hexdigest()
+        ext = os.path.splitext(url.split("?")[0])[1].lower() or ".jpg"
+        blob_path = os.path.join(self.store_dir, digest[:2], f"{digest}{ext}")
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+
+        with self._lock:
+            self.index[url] = blob_path
+            self._save_index()
+        return blob_path
+
+    def _place(self, future: Future, key: str, poster_path: str):
+        try:
+            blob_path = future.result()
+        except Exception as e:
+            self.logger.warning(f"Artwork download failed for {key}: {str(e)}")
+            with self._lock:
+                for k in [k for k, f in self._downloads.items() if f is future]:
+                    del self._downloads[k]
+                self._placing.discard(poster_path)
+            return
+
+        if os.path.exists(poster_path):
+            return
+
+        try:
+            tmp_path = f"{poster_path}.{threading.get_ident()}.tmp"
+            try:
+                os.link(blob_path, tmp_path)
+            except OSError:
+                shutil.copyfile(blob_path, tmp_path)
+            os.replace(tmp_path, poster_path)
+            self.logger.debug(f"Placed artwork: {poster_path}")
+        except Exception as e:
+            self.logger.warning(f"Failed to place artwork at {poster_path}: {str(e)}")
+
+    def close(self):
+        """Wait for queued downloads to finish."""
+        self._executor.shutdown(wait=True)
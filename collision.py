@@ -0,0 +1,52 @@
+import os
+import logging
+from typing import Optional
+
+from content_hash import sample_hash, sample_is_full, full_hash, recorded_hash
+from media_probe import probe
+
+IDENTICAL = "identical"
+BETTER = "better"        # incoming should replace the existing file
+WORSE = "worse"          # existing file is the keeper
+AMBIGUOUS = "ambiguous"  # needs a human: goes to DUPLICATE
+
+# Heights closer than this are the same resolution class (e.g. 1080 vs 1038 letterboxed)
+RESOLUTION_TOLERANCE = 0.1
+
+def compare(incoming: str, existing: str, logger: Optional[logging.Logger] = None) -> str:
+    """Decide what to do with an incoming file whose library target already exists.
+
+    Cheapest test first: size, then a head/tail sample hash, then a full hash (the
+    existing file's is taken from its sidecar when recorded), and for files that
+    differ, the probed resolution.
+    """
+    logger = logger or logging.getLogger("collision")
+    try:
+        incoming_size, existing_size = os.path.getsize(incoming), os.path.getsize(existing)
+    except OSError as e:
+        logger.warning(f"Cannot compare {incoming} with {existing}: {str(e)}")
+        return AMBIGUOUS
+
+    if incoming_size == existing_size:
+        incoming_sample, existing_sample = sample_hash(incoming), sample_hash(existing)
+        if incoming_sample and incoming_sample == existing_sample:
+            if sample_is_full(incoming_size):
+                return IDENTICAL
+            existing_full = recorded_hash(existing) or full_hash(existing)
+            incoming_full = full_hash(incoming)
+            if incoming_full and incoming_full == existing_full:
+                return IDENTICAL
+            logger.debug(f"Same size and samples but different content: {incoming}")
+
+    verdict = compare_quality(incoming, existing)
+    logger.debug(f"Quality comparison of {os.path.basename(incoming)} against existing: {verdict}")
+    return verdict
+
+def compare_quality(incoming: str, existing: str) -> str:
+    """Resolution decides; anything else (same resolution, unreadable headers) is ambiguous."""
+    new, old = probe(incoming), probe(existing)
+    if not new or not old or not new.height or not old.height:
+        return AMBIGUOUS
+    if abs(new.height - old.height) <= RESOLUTION_TOLERANCE * max(new.height, old.height):
+        return AMBIGUOUS
+    return BETTER if new.height > old.height else WORSE
@@ -1,8 +1,10 @@
 import os
 import configparser
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, List
 
+from io_qos import parse_size, TimeWindows
+
 CONFIG_PATH = '/opt/media-mover/media-mover.conf'
 
 @dataclass
@@ -19,6 +21,39 @@ class MediaMoverConfig:
     use_inotify: bool
     omdb_api_key: str
     omdb_api_url: str
+    omdb_cache_file: str = ''
+    lookup_stats_file: str = ''
+    omdb_secondary_url: str = ''
+    omdb_secondary_key: str = ''
+    hedge_percentile: float = 95.0
+    hedge_min_delay: float = 0.5
+    artwork_dir: str = ''
+    artwork_workers: int = 4
+    parse_cache_file: str = ''
+    parse_cache_size: int = 4096
+    fast_parse: bool = True
+    ingest_extras: bool = False
+    leftover_policy: str = 'unknown'
+    move_concurrency: int = 1
+    ingest_mode: str = 'move'
+    hash_copies: bool = True
+    verify_copies: bool = False
+    quarantine_dir: str = ''
+    verify_sfv: bool = True
+    verify_sfv_renames: bool = False
+    drop_lower_quality: bool = False
+    index_workers: int = 16
+    catalog_file: str = ''
+    reconcile_interval: int = 86400
+    ledger_file: str = ''
+    move_bandwidth_limit: int = 0
+    prime_time_limit: int = 0
+    prime_time_windows: str = ''
+    offpeak_windows: str = ''
+    defer_copies_above: int = 0
+    min_free_space: int = 1024 ** 3
+    tv_dirs: List[str] = field(default_factory=list)
+    movies_dirs: List[str] = field(default_factory=list)
 
 def load_config(path: str = CONFIG_PATH) -> MediaMoverConfig:
     """Load and validate configuration file into a structured config object."""
@@ -36,10 +71,21 @@ def load_config(path: str = CONFIG_PATH) -> MediaMoverConfig:
     def clean_int(val, fallback):
         return int(val.split('#')[0].strip()) if val else fallback
 
+    def roots(single_key, list_key):
+        # The single-root key, if set, comes first; the list key adds further roots
+        dirs = [parser.get('Paths', single_key, fallback='')]
+        dirs += parser.get('Paths', list_key, fallback='').split(',')
+        return list(dict.fromkeys(os.path.normpath(d.strip()) for d in dirs if d.strip()))
+
+    tv_dirs = roots('tv_dir', 'tv_dirs')
+    movies_dirs = roots('movies_dir', 'movies_dirs')
+    if not tv_dirs or not movies_dirs:
+        raise ValueError("At least one TV and one movies directory must be configured (tv_dir/tv_dirs, movies_dir/movies_dirs)")
+
     config = MediaMoverConfig(
         uploads_dir = parser.get('Paths', 'uploads_dir'),
-        tv_dir = parser.get('Paths', 'tv_dir'),
-        movies_dir = parser.get('Paths', 'movies_dir'),
+        tv_dir = tv_dirs[0],
+        movies_dir = movies_dirs[0],
         movies_kids_dir = parser.get('Paths', 'movies_kids_dir'),
         music_dir = parser.get('Paths', 'music_dir'),
         unknown_dir = parser.get('Paths', 'unknown_dir'),
@@ -48,12 +94,53 @@ def load_config(path: str = CONFIG_PATH) -> MediaMoverConfig:
         api_timeout = parser.getint('Settings', 'api_timeout', fallback=10),
         use_inotify = parser.getboolean('Settings', 'use_inotify', fallback=False),
         omdb_api_key = api_key,
-        omdb_api_url = parser.get('OMDb', 'api_url', fallback='http://www.omdbapi.com/')
+        omdb_api_url = parser.get('OMDb', 'api_url', fallback='http://www.omdbapi.com/'),
+        omdb_cache_file = parser.get('OMDb', 'cache_file', fallback=os.path.join(os.path.dirname(path), 'omdb_cache.json')),
+        lookup_stats_file = parser.get('OMDb', 'lookup_stats_file', fallback=os.path.join(os.path.dirname(path), 'lookup_stats.json')),
+        omdb_secondary_url = parser.get('OMDb', 'secondary_api_url', fallback=''),
+        omdb_secondary_key = parser.get('OMDb', 'secondary_api_key', fallback=''),
+        hedge_percentile = parser.getfloat('OMDb', 'hedge_percentile', fallback=95.0),
+        hedge_min_delay = parser.getfloat('OMDb', 'hedge_min_delay', fallback=0.5),
+        artwork_dir = parser.get('Paths', 'artwork_dir', fallback=''),
+        artwork_workers = parser.getint('Settings', 'artwork_workers', fallback=4),
+        parse_cache_file = parser.get('Settings', 'parse_cache_file', fallback=os.path.join(os.path.dirname(path), 'parse_cache.db')),
+        parse_cache_size = parser.getint('Settings', 'parse_cache_size', fallback=4096),
+        fast_parse = parser.getboolean('Settings', 'fast_parse', fallback=True),
+        ingest_extras = parser.getboolean('Settings', 'ingest_extras', fallback=False),
+        leftover_policy = parser.get('Settings', 'leftover_policy', fallback='unknown').strip().lower(),
+        move_concurrency = parser.getint('Settings', 'move_concurrency', fallback=1),
+        ingest_mode = parser.get('Settings', 'ingest_mode', fallback='move').strip().lower(),
+        hash_copies = parser.getboolean('Settings', 'hash_copies', fallback=True),
+        verify_copies = parser.getboolean('Settings', 'verify_copies', fallback=False),
+        quarantine_dir = parser.get('Paths', 'quarantine_dir', fallback=os.path.join(parser.get('Paths', 'uploads_dir'), 'QUARANTINE')),
+        verify_sfv = parser.getboolean('Settings', 'verify_sfv', fallback=True),
+        verify_sfv_renames = parser.getboolean('Settings', 'verify_sfv_renames', fallback=False),
+        drop_lower_quality = parser.getboolean('Settings', 'drop_lower_quality', fallback=False),
+        index_workers = parser.getint('Settings', 'index_workers', fallback=16),
+        catalog_file = parser.get('Settings', 'catalog_file', fallback=os.path.join(os.path.dirname(path), 'library.db')),
+        reconcile_interval = parser.getint('Settings', 'reconcile_interval', fallback=86400),
+        ledger_file = parser.get('Settings', 'ledger_file', fallback=os.path.join(os.path.dirname(path), 'processed.db')),
+        move_bandwidth_limit = parse_size(parser.get('Settings', 'move_bandwidth_limit', fallback='0')),
+        prime_time_limit = parse_size(parser.get('Settings', 'prime_time_limit', fallback='0')),
+        prime_time_windows = parser.get('Settings', 'prime_time_windows', fallback=''),
+        offpeak_windows = parser.get('Settings', 'offpeak_windows', fallback=''),
+        defer_copies_above = parse_size(parser.get('Settings', 'defer_copies_above', fallback='0')),
+        min_free_space = parse_size(parser.get('Settings', 'min_free_space', fallback='1G')),
+        tv_dirs = tv_dirs,
+        movies_dirs = movies_dirs
     )
 
+    if config.leftover_policy not in ('unknown', 'delete'):
+        raise ValueError(f"Invalid leftover_policy: {config.leftover_policy} (expected 'unknown' or 'delete')")
+    if config.ingest_mode not in ('move', 'link'):
+        raise ValueError(f"Invalid ingest_mode: {config.ingest_mode} (expected 'move' or 'link')")
+    # Fail at startup rather than on the first copy
+    TimeWindows(config.prime_time_windows)
+    TimeWindows(config.offpeak_windows)
+
     # Auto-create all path directories
     for path in [
-        config.uploads_dir, config.tv_dir, config.movies_dir,
+        config.uploads_dir, *config.tv_dirs, *config.movies_dirs,
         config.movies_kids_dir, config.music_dir, config.unknown_dir
     ]:
         os.makedirs(path, exist_ok=True)
@@ -0,0 +1,51 @@
+import os
+import json
+from typing import Optional
+
+import xxhash
+
+# Bytes hashed from each end of a file for the cheap content fingerprint
+SAMPLE_BYTES = 1024 * 1024
+HASH_CHUNK = 8 * 1024 * 1024
+
+def sample_hash(path: str) -> Optional[str]:
+    """xxh64 of the size plus the first and last SAMPLE_BYTES; covers the whole file when it is small."""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            h = xxhash.xxh64(str(size).encode())
+            h.update(f.read(SAMPLE_BYTES))
+            if size > 2 * SAMPLE_BYTES:
+                f.seek(-SAMPLE_BYTES, os.SEEK_END)
+                h.update(f.read(SAMPLE_BYTES))
+            elif size > SAMPLE_BYTES:
+                h.update(f.read())
+        return h.hexdigest()
+    except OSError:
+        return None
+
+def sample_is_full(size: int) -> bool:
+    """Whether sample_hash() read every byte of a file this size."""
+    return size <= 2 * SAMPLE_BYTES
+
+def full_hash(path: str) -> Optional[str]:
+    """xxh64 of the whole file, the same digest the move engine records while copying."""
+    h = xxhash.xxh64()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                h.update(chunk)
+        return h.hexdigest()
+    except OSError:
+        return None
+
+def recorded_hash(path: str) -> Optional[str]:
+    """Full hash saved in the file's sidecar JSON when it was copied, if it still matches its size."""
+    try:
+        with open(f"{os.path.splitext(path)[0]}.json", "r", encoding="utf-8") as f:
+            integrity = json.load(f).get("integrity") or {}
+        if integrity.get("algorithm") == "xxh64" and integrity.get("size") == os.path.getsize(path):
+            return integrity.get("hash")
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
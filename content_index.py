@@ -0,0 +1,106 @@
+import os
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from content_hash import sample_hash, sample_is_full, full_hash, recorded_hash
+from library_catalog import LibraryCatalog
+
+class ContentIndex:
+    """Library files by size, then sampled hash, for catching re-uploads under another name.
+
+    An incoming file whose size matches nothing is ruled out as a duplicate with a
+    lookup and no reads; a size match costs one sample hash, and only a sample
+    match is confirmed with a full hash.
+
+    With a catalog, candidates come from its size index and the catalog is the
+    store (written by whoever places files, and filled with pre-existing library
+    files by the reconciler); without one, entries are kept in memory via add()
+    and only cover files placed since startup.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, catalog: Optional[LibraryCatalog] = None):
+        self.logger = logger or logging.getLogger("content_index")
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._by_size: Dict[int, Dict[str, Tuple[Optional[str], Optional[str]]]] = {}  # size -> path -> (sample, full)
+        self._sizes: Dict[str, int] = {}
+
+    def add(self, path: str, size: int, sample: Optional[str] = None, full: Optional[str] = None):
+        path = os.path.normpath(path)
+        with self._lock:
+            self._discard(path)
+            self._by_size.setdefault(size, {})[path] = (sample, full)
+            self._sizes[path] = size
+
+    def remove(self, path: str):
+        if self.catalog:
+            self.catalog.remove(path)
+        with self._lock:
+            self._discard(os.path.normpath(path))
+
+    def rename(self, old: str, new: str):
+        old, new = os.path.normpath(old), os.path.normpath(new)
+        if self.catalog:
+            self.catalog.rename(old, new)
+        with self._lock:
+            size = self._sizes.get(old)
+            if size is None:
+                return
+            hashes = self._by_size[size][old]
+            self._discard(old)
+            self._discard(new)
+            self._by_size.setdefault(size, {})[new] = hashes
+            self._sizes[new] = size
+
+    def _discard(self, path: str):
+        size = self._sizes.pop(path, None)
+        if size is not None:
+            bucket = self._by_size.get(size, {})
+            bucket.pop(path, None)
+            if not bucket:
+                self._by_size.pop(size, None)
+
+    def find(self, path: str) -> Optional[str]:
+        """Library path holding exactly the same bytes as path, if any."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if self.catalog:
+            candidates = {p: (s, f) for p, s, f in self.catalog.by_size(size)}
+        else:
+            with self._lock:
+                candidates = dict(self._by_size.get(size, {}))
+        if not candidates:
+            return None
+
+        sample = sample_hash(path)
+        incoming_full = None
+        for library_path, (library_sample, library_full) in candidates.items():
+            if not os.path.lexists(library_path):
+                self.remove(library_path)
+                continue
+            if library_sample is None:
+                library_sample = sample_hash(library_path)
+                self._update(library_path, size, library_sample, library_full)
+            if not sample or library_sample != sample:
+                continue
+            if sample_is_full(size):
+                return library_path
+
+            incoming_full = incoming_full or full_hash(path)
+            if library_full is None:
+                library_full = recorded_hash(library_path) or full_hash(library_path)
+                self._update(library_path, size, library_sample, library_full)
+            if incoming_full and incoming_full == library_full:
+                return library_path
+        return None
+
+    def _update(self, path: str, size: int, sample: Optional[str], full: Optional[str]):
+        if self.catalog:
+            self.catalog.set_hashes(path, sample, full)
+            return
+        with self._lock:
+            if self._sizes.get(path) == size:
+                self._by_size[size][path] = (sample, full)
@@ -0,0 +1,179 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+from media_probe import probe
+
+VIDEO_EXTS = (".mkv", ".mp4", ".avi", ".mov", ".m4v", ".ts")
+AUDIO_EXTS = (".flac", ".mp3")
+SUBTITLE_EXTS = (".srt", ".ass", ".ssa", ".sub", ".idx", ".vtt")
+
+SAMPLE_PATTERN = re.compile(r'(?:^|[\W_])sample(?:[\W_]|$)', re.IGNORECASE)
+# Extras live in a dedicated subfolder or carry a Plex-style "-trailer" suffix
+EXTRAS_DIR_PATTERN = re.compile(
+    r'^(?:extras?|featurettes?|behind[\W_]the[\W_]scenes|deleted[\W_]scenes|interviews|trailers|bonus|shorts|other)$',
+    re.IGNORECASE
+)
+EXTRAS_SUFFIX_PATTERN = re.compile(r'-(?:behindthescenes|deleted|featurette|interview|scene|short|trailer|other)$', re.IGNORECASE)
+SUBS_DIR_PATTERN = re.compile(r'^(?:subs?|subtitles?)$', re.IGNORECASE)
+# "filename CRC32" per line; ';' starts a comment
+SFV_LINE_PATTERN = re.compile(r'^\s*(.+?)\s+([0-9A-Fa-f]{8})\s*$')
+
+# A video this much smaller than the main feature, or this short, is a sample
+SAMPLE_SIZE_RATIO = 0.05
+SAMPLE_NAMED_MAX_BYTES = 500_000_000
+SAMPLE_MAX_DURATION = 300
+FEATURE_MIN_DURATION = 1200
+
+class IngestManifest:
+    """Which files of a release folder are published, and which are left behind."""
+
+    __slots__ = ("folder", "main", "subtitles", "extras", "samples", "pending", "leftover", "skipped", "checksums")
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.main: Optional[str] = None
+        self.subtitles: List[str] = []
+        self.extras: List[str] = []
+        self.samples: List[str] = []
+        self.pending: List[str] = []   # other features (e.g. further episodes) for a later pass
+        self.leftover: List[str] = []  # samples, unwanted extras and junk
+        self.skipped: List[str] = []   # already ingested on an earlier pass (link mode)
+        self.checksums: Dict[str, str] = {}  # path -> CRC32 from the release's .sfv files
+
+    def expected(self, path: str) -> Optional[Dict[str, str]]:
+        crc = self.checksums.get(path)
+        return {"crc32": crc} if crc else None
+
+    def leftover_bytes(self) -> int:
+        return sum(_size(p) for p in self.leftover)
+
+    def summary(self) -> str:
+        return (
+            f"main={os.path.basename(self.main) if self.main else None}, "
+            f"{len(self.subtitles)} subtitle(s), {len(self.extras)} extra(s), {len(self.samples)} sample(s), "
+            f"{len(self.pending)} pending, {len(self.leftover)} left behind ({self.leftover_bytes() / 1e6:.1f} MB)"
+        )
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def parse_sfv(path: str) -> Dict[str, str]:
+    """Map the files listed in an .sfv (resolved next to it) to their lowercase CRC32."""
+    entries = {}
+    directory = os.path.dirname(path)
+    try:
+        with open(path, "r", encoding="latin-1") as f:
+            for line in f:
+                if line.lstrip().startswith(";"):
+                    continue
+                match = SFV_LINE_PATTERN.match(line)
+                if match:
+                    name = match.group(1).strip().replace("\\", os.sep)
+                    entries[os.path.normpath(os.path.join(directory, name))] = match.group(2).lower()
+    except OSError:
+        pass
+    return entries
+
+def _named_sample(path: str) -> bool:
+    # The size cap keeps a feature like "Sample.People.2019.mkv" from being dropped
+    stem = os.path.splitext(os.path.basename(path))[0]
+    parent = os.path.basename(os.path.dirname(path))
+    return bool(SAMPLE_PATTERN.search(stem) or parent.lower() == "sample") and _size(path) < SAMPLE_NAMED_MAX_BYTES
+
+def _is_sample(path: str, main_size: int, main_duration: Optional[float]) -> bool:
+    if _named_sample(path):
+        return True
+    if main_size and _size(path) < main_size * SAMPLE_SIZE_RATIO:
+        return True
+    if main_duration and main_duration >= FEATURE_MIN_DURATION:
+        info = probe(path)
+        if info and info.duration and info.duration < SAMPLE_MAX_DURATION:
+            return True
+    return False
+
+def build_manifest(folder: str, include_extras: bool = False,
+                   skip: Optional[Callable[[str], bool]] = None) -> IngestManifest:
+    """Classify a release folder's files into main media, subtitles, extras, samples and junk.
+
+    Files for which skip() is true were ingested before and are left out.
+    """
+    manifest = IngestManifest(folder)
+    files = [os.path.join(root, f) for root, _, names in os.walk(folder) for f in names]
+    if skip:
+        manifest.skipped = [p for p in files if skip(p)]
+        files = [p for p in files if p not in manifest.skipped]
+    videos = [p for p in files if p.lower().endswith(VIDEO_EXTS)]
+
+    if not videos:
+        # Audio-only folders (albums) are handled as a unit
+        audio = [p for p in files if p.lower().endswith(AUDIO_EXTS)]
+        if audio:
+            manifest.main = max(audio, key=_size)
+        return manifest
+
+    def named_extra(p: str) -> bool:
+        parts = os.path.relpath(p, folder).split(os.sep)
+        return (any(EXTRAS_DIR_PATTERN.match(d) for d in parts[:-1])
+                or bool(EXTRAS_SUFFIX_PATTERN.search(os.path.splitext(parts[-1])[0])))
+
+    features = [p for p in videos if not named_extra(p) and not _named_sample(p)]
+    if not features:
+        return manifest
+    manifest.main = max(features, key=_size)
+    main_size = _size(manifest.main)
+    main_info = probe(manifest.main)
+    main_duration = main_info.duration if main_info else None
+
+    for path in videos:
+        if path == manifest.main:
+            continue
+        if named_extra(path):
+            if include_extras:
+                manifest.extras.append(path)
+        elif _is_sample(path, main_size, main_duration):
+            manifest.samples.append(path)
+        else:
+            manifest.pending.append(path)
+
+    main_stem = os.path.splitext(os.path.basename(manifest.main))[0].lower()
+    single_feature = not manifest.pending
+    for path in files:
+        if not path.lower().endswith(SUBTITLE_EXTS):
+            continue
+        stem = os.path.basename(path).lower()
+        in_subs_dir = any(SUBS_DIR_PATTERN.match(part) for part in os.path.relpath(path, folder).split(os.sep)[:-1])
+        in_main_subdir = os.path.basename(os.path.dirname(path)).lower() == main_stem
+        if stem.startswith(main_stem) or in_main_subdir or (in_subs_dir and single_feature):
+            manifest.subtitles.append(path)
+
+    kept = {manifest.main, *manifest.subtitles, *manifest.extras, *manifest.pending}
+    manifest.leftover = [p for p in files if p not in kept]
+
+    # SFVs are written on Windows, so match listed names case-insensitively
+    by_lower = {os.path.normpath(p).lower(): p for p in kept}
+    for path in files:
+        if path.lower().endswith(".sfv"):
+            for listed, crc in parse_sfv(path).items():
+                actual = by_lower.get(listed.lower())
+                if actual:
+                    manifest.checksums[actual] = crc
+    return manifest
+
+def subtitle_target(subtitle_path: str, main_path: str, target_path: str) -> str:
+    """Name a subtitle after the placed main file, keeping language/flag suffixes."""
+    main_stem = os.path.splitext(os.path.basename(main_path))[0]
+    stem, ext = os.path.splitext(os.path.basename(subtitle_path))
+    if stem.lower().startswith(main_stem.lower()):
+        suffix = stem[len(main_stem):]
+    else:
+        # e.g. Subs/2_English.srt -> ".English"
+        label = re.sub(r'^[\d_\W]+', '', stem)
+        suffix = f".{label}" if label else ""
+    return f"{os.path.splitext(target_path)[0]}{suffix}{ext.lower()}"
+
+def extra_target(extra_path: str, target_path: str) -> str:
+    return os.path.join(os.path.dirname(target_path), "Extras", os.path.basename(extra_path))
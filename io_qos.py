@@ -0,0 +1,83 @@
+import re
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+WINDOW_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$')
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_size(text: str) -> int:
+    """Parse '512', '100M', '1.5G' style sizes into bytes (0 stays 0 = unlimited/off)."""
+    match = SIZE_PATTERN.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+class TimeWindows:
+    """Daily clock windows such as '18:00-23:30, 23:45-01:00' (may wrap midnight)."""
+
+    def __init__(self, spec: str = ""):
+        self.windows: List[Tuple[int, int]] = []
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            match = WINDOW_PATTERN.match(part)
+            if not match:
+                raise ValueError(f"Invalid time window: {part!r}")
+            h1, m1, h2, m2 = (int(g) for g in match.groups())
+            self.windows.append((h1 * 60 + m1, h2 * 60 + m2))
+
+    def __bool__(self) -> bool:
+        return bool(self.windows)
+
+    def contains(self, when: Optional[datetime] = None) -> bool:
+        when = when or datetime.now()
+        minute = when.hour * 60 + when.minute
+        for start, end in self.windows:
+            if start <= end and start <= minute < end:
+                return True
+            if start > end and (minute >= start or minute < end):
+                return True
+        return False
+
+class IoPolicy:
+    """Bandwidth caps per destination device, a lower cap in prime time, and off-peak deferral."""
+
+    def __init__(self, bandwidth_limit: int = 0, prime_time_limit: int = 0, prime_time: str = "",
+                 offpeak: str = "", defer_above: int = 0):
+        self.bandwidth_limit = bandwidth_limit
+        self.prime_time_limit = prime_time_limit
+        self.prime_time = TimeWindows(prime_time)
+        self.offpeak = TimeWindows(offpeak)
+        self.defer_above = defer_above
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, List[float]] = {}  # device -> [available bytes, last refill time]
+
+    def current_limit(self) -> int:
+        """Bytes/sec allowed per device right now (0 = unlimited)."""
+        if self.prime_time and self.prime_time_limit and self.prime_time.contains():
+            return self.prime_time_limit
+        return self.bandwidth_limit
+
+    def should_defer(self, size: int) -> bool:
+        """Large copies wait for the off-peak window when one is configured."""
+        return bool(self.defer_above and self.offpeak and size > self.defer_above and not self.offpeak.contains())
+
+    def in_offpeak(self) -> bool:
+        return not self.offpeak or self.offpeak.contains()
+
+    def throttle(self, device: int, nbytes: int):
+        """Token bucket per device: sleep long enough that copies to it stay under the limit."""
+        limit = self.current_limit()
+        if not limit:
+            return
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._buckets.setdefault(device, [float(limit), now])
+            # Refill, allowing at most one second of burst
+            bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            bucket[0] -= nbytes
+            wait = -bucket[0] / limit if bucket[0] < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    path TEXT PRIMARY KEY,
+    source TEXT,
+    imdb_id TEXT,
+    type TEXT,
+    title TEXT,
+    year TEXT,
+    season INTEGER,
+    episode INTEGER,
+    size INTEGER NOT NULL,
+    dev INTEGER,
+    inode INTEGER,
+    sample_hash TEXT,
+    content_hash TEXT,
+    hash_algorithm TEXT,
+    method TEXT,
+    probe TEXT,
+    placed_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_imdb ON items (imdb_id);
+CREATE INDEX IF NOT EXISTS items_episode ON items (imdb_id, season, episode);
+CREATE INDEX IF NOT EXISTS items_hash ON items (content_hash);
+CREATE INDEX IF NOT EXISTS items_size ON items (size);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+def _number(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class LibraryCatalog:
+    """SQLite record of every file media-mover has placed in the library."""
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger("library_catalog")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def record(self, source: str, path: str, media_info: Optional[Dict[str, Any]], size: int,
+               sample: Optional[str] = None, content_hash: Optional[str] = None, method: str = ""):
+        """Insert or refresh one placed file in a single transaction."""
+        info = media_info or {}
+        try:
+            st = os.stat(path)
+            dev, inode = st.st_dev, st.st_ino
+        except OSError:
+            dev = inode = None
+        now = time.time()
+        row = (
+            os.path.normpath(path), source, info.get("imdbID"), info.get("Type"), info.get("Title"), info.get("Year"),
+            _number(info.get("season")), _number(info.get("episode")), size, dev, inode, sample, content_hash,
+            "xxh64" if content_hash else None, method, json.dumps(info["Probe"]) if info.get("Probe") else None, now, now
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO items (path, source, imdb_id, type, title, year, season, episode, size, dev, inode, "
+                "sample_hash, content_hash, hash_algorithm, method, probe, placed_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET source=excluded.source, "
+                "imdb_id=COALESCE(excluded.imdb_id, imdb_id), type=COALESCE(excluded.type, type), "
+                "title=COALESCE(excluded.title, title), year=COALESCE(excluded.year, year), "
+                "season=COALESCE(excluded.season, season), episode=COALESCE(excluded.episode, episode), "
+                "size=excluded.size, dev=excluded.dev, inode=excluded.inode, sample_hash=excluded.sample_hash, "
+                "content_hash=excluded.content_hash, hash_algorithm=excluded.hash_algorithm, method=excluded.method, "
+                "probe=COALESCE(excluded.probe, probe), updated_at=excluded.updated_at",
+                row
+            )
+
+    def by_size(self, size: int) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """(path, sample hash, content hash) of every item of exactly this size."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, sample_hash, content_hash FROM items WHERE size = ?", (size,)
+            ).fetchall()
+
+    def set_hashes(self, path: str, sample: Optional[str], content_hash: Optional[str]):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE items SET sample_hash = ?, content_hash = ?, hash_algorithm = ?, updated_at = ? WHERE path = ?",
+                (sample, content_hash, "xxh64" if content_hash else None, time.time(), os.path.normpath(path))
+            )
+
+    def refresh_stat(self, path: str):
+        """Re-read device/inode after the file was swapped (e.g. relinked)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE items SET dev = ?, inode = ?, updated_at = ? WHERE path = ?",
+                (st.st_dev, st.st_ino, time.time(), os.path.normpath(path))
+            )
+
+    def remove(self, path: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM items WHERE path = ?", (os.path.normpath(path),))
+
+    def rename(self, old: str, new: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM items WHERE path = ?", (os.path.normpath(new),))
+            self._db.execute(
+                "UPDATE items SET path = ?, updated_at = ? WHERE path = ?",
+                (os.path.normpath(new), time.time(), os.path.normpath(old))
+            )
+
+    def files_in(self, directory: str, recursive: bool = False) -> Dict[str, Tuple[Optional[int], Optional[int]]]:
+        """path -> (dev, inode) of catalogued files directly in (or anywhere under) a directory."""
+        prefix = os.path.normpath(directory) + os.sep
+        with self._lock:
+            # Range scan on the primary key: every path starting with prefix
+            rows = self._db.execute(
+                "SELECT path, dev, inode FROM items WHERE path >= ? AND path < ?",
+                (prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+            ).fetchall()
+        return {path: (dev, inode) for path, dev, inode in rows if recursive or os.sep not in path[len(prefix):]}
+
+    def dir_mtimes(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT path, mtime_ns FROM dirs").fetchall())
+
+    def apply_changes(self, added: List[Tuple[str, int, int, int]], removed: List[str],
+                      renamed: List[Tuple[str, str]], dirs: Dict[str, int], gone_dirs: List[str],
+                      started: float):
+        """Apply one reconcile pass in a single transaction.
+
+        added holds (path, size, dev, inode) of files found on disk; a row whose inode
+        changed is refreshed and its hashes cleared. Files are placed while a pass
+        runs, so rows written since `started` are newer than the listing and are
+        neither removed nor renamed, and a row already holding the listed inode
+        keeps its hashes.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            for old, new in renamed:
+                moved = self._db.execute(
+                    "SELECT 1 FROM items WHERE path = ? AND updated_at <= ?", (old, started)
+                ).fetchone()
+                if not moved:
+                    continue
+                self._db.execute("DELETE FROM items WHERE path = ?", (new,))
+                self._db.execute("UPDATE items SET path = ?, updated_at = ? WHERE path = ?", (new, now, old))
+            self._db.executemany(
+                "DELETE FROM items WHERE path = ? AND updated_at <= ?", [(p, started) for p in removed]
+            )
+            self._db.executemany(
+                "INSERT INTO items (path, size, dev, inode, method, placed_at, updated_at) VALUES (?, ?, ?, ?, 'found', ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size=excluded.size, dev=excluded.dev, inode=excluded.inode, "
+                "sample_hash=NULL, content_hash=NULL, hash_algorithm=NULL, updated_at=excluded.updated_at "
+                "WHERE dev IS NOT excluded.dev OR inode IS NOT excluded.inode",
+                [(path, size, dev, inode, now, now) for path, size, dev, inode in added]
+            )
+            self._db.executemany("DELETE FROM dirs WHERE path = ?", [(p,) for p in gone_dirs])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", list(dirs.items())
+            )
+
+    def find_imdb(self, imdb_id: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT path FROM items WHERE imdb_id = ?", (imdb_id,))]
+
+    def find_episode(self, imdb_id: str, season, episode) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute(
+                "SELECT path FROM items WHERE imdb_id = ? AND season = ? AND episode = ?",
+                (imdb_id, _number(season), _number(episode))
+            )]
+
+    def duplicates(self) -> List[List[str]]:
+        """Groups of paths sharing one content hash."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT content_hash, path FROM items WHERE content_hash IN "
+                "(SELECT content_hash FROM items WHERE content_hash IS NOT NULL GROUP BY content_hash HAVING COUNT(*) > 1) "
+                "ORDER BY content_hash, path"
+            ).fetchall()
+        groups: Dict[str, List[str]] = {}
+        for content_hash, path in rows:
+            groups.setdefault(content_hash, []).append(path)
+        return list(groups.values())
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            by_type = dict(self._db.execute("SELECT COALESCE(type, 'other'), COUNT(*) FROM items GROUP BY 1").fetchall())
+            total, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM items").fetchone()
+        return {"items": total, "bytes": size, "by_type": by_type}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+if __name__ == "__main__":
+    # Library report straight from the catalog, without walking the library
+    from config_loader import load_config
+
+    parser = argparse.ArgumentParser(description="Query the media-mover library catalog")
+    parser.add_argument("--imdb", help="List files placed for this IMDb id")
+    parser.add_argument("--duplicates", action="store_true", help="List files with identical content")
+    args = parser.parse_args()
+
+    catalog = LibraryCatalog(load_config().catalog_file)
+    if args.imdb:
+        print("\n".join(catalog.find_imdb(args.imdb)))
+    elif args.duplicates:
+        for group in catalog.duplicates():
+            print("\n  ".join(["Identical:"] + group))
+    else:
+        report = catalog.summary()
+        print(f"{report['items']} files, {report['bytes'] / 1e12:.2f} TB")
+        for media_type, count in sorted(report["by_type"].items()):
+            print(f"  {media_type}: {count}")
+    catalog.close()
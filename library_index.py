@@ -0,0 +1,164 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, List, Optional, Set, Tuple
+
+try:
+    import pyinotify
+except ImportError:  # optional dependency
+    pyinotify = None
+
+INDEX_WORKERS = 16
+
+class LibraryIndex:
+    """In-memory set of the files and directories under the library roots.
+
+    Built once at startup with a parallel scandir (directory listings over SMB are
+    latency-bound, so many in flight at once), then kept current by our own moves
+    and, optionally, inotify. Lookups are set membership; a positive answer is
+    confirmed with a single stat because an external delete may not have been seen.
+    """
+
+    def __init__(self, roots: Iterable[str], logger: Optional[logging.Logger] = None,
+                 workers: int = INDEX_WORKERS, watch: bool = False):
+        self.logger = logger or logging.getLogger("library_index")
+        self.roots = sorted({os.path.normpath(os.path.abspath(r)) for r in roots if r})
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._files: Set[str] = set()
+        self._dirs: Set[str] = set()
+        self._ready = False
+        self._notifier = None
+        self.watch = watch
+
+    def build(self):
+        start = time.monotonic()
+        files: Set[str] = set()
+        dirs: Set[str] = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="index") as pool:
+            pending = {pool.submit(_list_dir, root) for root in self.roots if os.path.isdir(root)}
+            dirs.update(root for root in self.roots if os.path.isdir(root))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    sub_files, sub_dirs = future.result()
+                    files.update(sub_files)
+                    dirs.update(sub_dirs)
+                    pending.update(pool.submit(_list_dir, d) for d in sub_dirs)
+
+        with self._lock:
+            self._files, self._dirs = files, dirs
+            self._ready = True
+        self.logger.info(
+            f"Indexed {len(files)} files in {len(dirs)} directories under {len(self.roots)} root(s) "
+            f"in {time.monotonic() - start:.2f}s"
+        )
+        if self.watch:
+            self._start_watch()
+
+    def covers(self, path: str) -> bool:
+        """True if path lies under an indexed root (so the index can answer for it)."""
+        path = os.path.abspath(path)
+        return self._ready and any(path == root or path.startswith(root + os.sep) for root in self.roots)
+
+    def exists(self, path: str) -> bool:
+        if not self.covers(path):
+            return os.path.lexists(path)
+        path = os.path.normpath(os.path.abspath(path))
+        with self._lock:
+            known = path in self._files or path in self._dirs
+        if not known:
+            return False
+        if os.path.lexists(path):
+            return True
+        self.remove(path)  # deleted behind our back
+        return False
+
+    def is_dir(self, path: str) -> bool:
+        path = os.path.normpath(os.path.abspath(path))
+        with self._lock:
+            return path in self._dirs
+
+    def ensure_dir(self, path: str):
+        """makedirs, skipped entirely when the directory is already known."""
+        path = os.path.normpath(os.path.abspath(path))
+        if self.is_dir(path):
+            return
+        os.makedirs(path, exist_ok=True)
+        if self.covers(path):
+            with self._lock:
+                while path not in self._dirs and self.covers(path):
+                    self._dirs.add(path)
+                    path = os.path.dirname(path)
+
+    def add(self, path: str):
+        """Record a file or tree we just placed in the library."""
+        if not self.covers(path):
+            return
+        path = os.path.normpath(os.path.abspath(path))
+        self.ensure_dir(os.path.dirname(path))
+        if os.path.isdir(path) and not os.path.islink(path):
+            with self._lock:
+                for root, dirs, files in os.walk(path):
+                    self._dirs.add(root)
+                    self._files.update(os.path.join(root, f) for f in files)
+        else:
+            with self._lock:
+                self._files.add(path)
+
+    def remove(self, path: str):
+        path = os.path.normpath(os.path.abspath(path))
+        with self._lock:
+            self._files.discard(path)
+            if path in self._dirs:
+                prefix = path + os.sep
+                self._dirs = {d for d in self._dirs if d != path and not d.startswith(prefix)}
+                self._files = {f for f in self._files if not f.startswith(prefix)}
+
+    def _start_watch(self):
+        if pyinotify is None:
+            self.logger.warning("use_inotify is set but pyinotify is not installed — library index won't see external changes")
+            return
+        index = self
+
+        class Handler(pyinotify.ProcessEvent):
+            def process_IN_CREATE(self, event):
+                index.add(event.pathname)
+
+            def process_IN_MOVED_TO(self, event):
+                index.add(event.pathname)
+
+            def process_IN_DELETE(self, event):
+                index.remove(event.pathname)
+
+            def process_IN_MOVED_FROM(self, event):
+                index.remove(event.pathname)
+
+        manager = pyinotify.WatchManager()
+        mask = pyinotify.IN_CREATE | pyinotify.IN_DELETE | pyinotify.IN_MOVED_TO | pyinotify.IN_MOVED_FROM
+        self._notifier = pyinotify.ThreadedNotifier(manager, Handler())
+        self._notifier.daemon = True
+        self._notifier.start()
+        for root in self.roots:
+            manager.add_watch(root, mask, rec=True, auto_add=True, quiet=True)
+        self.logger.info(f"Watching {len(self.roots)} library root(s) for changes")
+
+    def close(self):
+        if self._notifier:
+            self._notifier.stop()
+            self._notifier = None
+
+def _list_dir(path: str) -> Tuple[List[str], List[str]]:
+    files, dirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                else:
+                    files.append(entry.path)
+    except OSError:
+        pass
+    return files, dirs
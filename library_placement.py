@@ -0,0 +1,62 @@
+import os
+import logging
+from typing import Callable, Dict, List, Optional
+
+def free_bytes(path: str) -> int:
+    """Space available to us on the filesystem holding path (-1 if it can't be read)."""
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return -1
+    return st.f_bavail * st.f_frsize
+
+class LibraryPlacement:
+    """Picks which of a category's library roots a new item goes to.
+
+    An item whose folder (show, movie) already exists on a root stays with it.
+    Otherwise a root on the same device as the upload wins, so the move is a
+    rename rather than a copy, and failing that the root with the most free space
+    once space `reserved` for copies already headed to its device is taken off.
+    """
+
+    def __init__(self, index, logger: Optional[logging.Logger] = None,
+                 reserved: Optional[Callable[[int], int]] = None):
+        self.index = index
+        self.logger = logger or logging.getLogger("library_placement")
+        self.reserved = reserved
+        self._devices: Dict[str, Optional[int]] = {}
+
+    def device(self, root: str) -> Optional[int]:
+        if root not in self._devices:
+            try:
+                self._devices[root] = os.stat(root).st_dev
+            except OSError:
+                return None
+        return self._devices[root]
+
+    def available(self, root: str) -> int:
+        free = free_bytes(root)
+        device = self.device(root)
+        if self.reserved and device is not None:
+            free -= self.reserved(device)
+        return free
+
+    def root_for(self, roots: List[str], folder: str, source_path: Optional[str] = None) -> str:
+        if len(roots) == 1:
+            return roots[0]
+        for root in roots:
+            if self.index.exists(os.path.join(root, folder)):
+                return root
+
+        candidates = roots
+        if source_path:
+            try:
+                source_dev = os.lstat(source_path).st_dev
+                candidates = [root for root in roots if self.device(root) == source_dev] or roots
+            except OSError:
+                pass
+        root = max(candidates, key=self.available)
+        self.logger.debug(
+            f"Placing {folder} on {root} ({'same device as upload' if candidates is not roots else 'most free space'})"
+        )
+        return root
@@ -0,0 +1,203 @@
+import os
+import json
+import hashlib
+import difflib
+import logging
+from typing import Optional, Dict, Any, List
+
+# API calls spent by each lookup step when it runs to completion
+STEP_COSTS = {
+    "cache": 0,
+    "imdb_id": 1,
+    "title": 1,
+    "alt_type": 1,
+    "search": 2,  # typeless 's' listing + exact 'i' follow-up
+}
+
+# Prior success rates used until a step has history of its own
+STEP_PRIORS = {
+    "cache": 1.0,
+    "imdb_id": 0.95,
+    "title": 0.7,
+    "alt_type": 0.2,
+    "search": 0.5,
+}
+
+PRIOR_WEIGHT = 2
+MAX_CACHE_ENTRIES = 5000
+
+
+def cache_key(title: str) -> str:
+    """Key format shared with omdb_cache.json (md5 of the lowercased title)."""
+    return hashlib.md5(title.strip().lower().encode("utf-8")).hexdigest()
+
+
+class LookupPlanner:
+    """Resolves titles through the cheapest, most likely OMDb lookup steps first."""
+
+    def __init__(self, omdb, logger: Optional[logging.Logger] = None,
+                 cache_path: Optional[str] = None, stats_path: Optional[str] = None):
+        self.omdb = omdb
+        self.logger = logger or logging.getLogger("lookup_planner")
+        self.cache_path = cache_path
+        self.stats_path = stats_path
+
+        self.cache: Dict[str, Dict[str, Any]] = self._load_json(cache_path)
+        self.by_id: Dict[str, Dict[str, Any]] = {
+            v["imdbID"]: v for v in self.cache.values() if isinstance(v, dict) and v.get("imdbID")
+        }
+
+        state = self._load_json(stats_path)
+        self.stats: Dict[str, Dict[str, int]] = state.get("steps", {})
+        self.totals: Dict[str, int] = state.get("totals", {"resolved": 0, "failed": 0, "calls": 0})
+
+    def _load_json(self, path: Optional[str]) -> Dict[str, Any]:
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable planner state {path}: {str(e)}")
+            return {}
+
+    def _save_json(self, path: Optional[str], data: Dict[str, Any]):
+        if not path:
+            return
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"Failed to save planner state {path}: {str(e)}")
+
+    def success_rate(self, step: str, media_type: str) -> float:
+        """Smoothed success rate of a step for the guessed media type."""
+        s = self.stats.get(f"{media_type}:{step}", {})
+        hits = s.get("hits", 0) + STEP_PRIORS[step] * PRIOR_WEIGHT
+        return hits / (s.get("attempts", 0) + PRIOR_WEIGHT)
+
+    def expected_cost(self, step: str, media_type: str) -> float:
+        """Expected API calls per success if this step is tried."""
+        cost = STEP_COSTS[step]
+        if cost == 0:
+            return 0.0
+        return cost / max(self.success_rate(step, media_type), 0.01)
+
+    def plan(self, media_type: str, imdb_id: Optional[str] = None) -> List[str]:
+        steps = sorted(["cache", "title", "alt_type", "search"], key=lambda step: self.expected_cost(step, media_type))
+        if imdb_id:
+            # A known id is exact, so it outranks any title guess regardless of history
+            steps.insert(1, "imdb_id")
+        return steps
+
+    def resolve(self, title: str, year: Optional[str] = None, media_type: str = "movie",
+                imdb_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Run the lookup plan until a step yields metadata; return it or None."""
+        steps = self.plan(media_type, imdb_id)
+        self.logger.debug(
+            f"Lookup plan for '{title}' ({year}) [{media_type}]: "
+            + " -> ".join(f"{s}({self.expected_cost(s, media_type):.2f})" for s in steps)
+        )
+
+        calls_before = self.omdb.api_call_count
+        result = None
+        for step in steps:
+            step_calls = self.omdb.api_call_count
+            result = self._run_step(step, title, year, media_type, imdb_id)
+            self._record(step, media_type, result is not None)
+            self.logger.debug(
+                f"Lookup step '{step}' {'hit' if result else 'missed'} "
+                f"({self.omdb.api_call_count - step_calls} call(s))"
+            )
+            if result:
+                break
+
+        calls = self.omdb.api_call_count - calls_before
+        self.totals["calls"] = self.totals.get("calls", 0) + calls
+        if result:
+            self.totals["resolved"] = self.totals.get("resolved", 0) + 1
+            self._remember(title, result)
+            self.logger.info(
+                f"Resolved '{title}' via {step} in {calls} API call(s) "
+                f"(avg {self.average_calls():.2f} calls/resolved item)"
+            )
+        else:
+            self.totals["failed"] = self.totals.get("failed", 0) + 1
+            self.logger.info(f"Lookup plan exhausted for '{title}' after {calls} API call(s)")
+
+        self._save_json(self.stats_path, {"steps": self.stats, "totals": self.totals})
+        return dict(result) if result else None
+
+    def average_calls(self) -> float:
+        resolved = self.totals.get("resolved", 0)
+        return self.totals.get("calls", 0) / resolved if resolved else 0.0
+
+    def _run_step(self, step: str, title: str, year: Optional[str], media_type: str,
+                  imdb_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if step == "cache":
+            if imdb_id:
+                return self.by_id.get(imdb_id)
+            cached = self.cache.get(cache_key(title))
+            if cached and (not year or str(cached.get("Year", "")).startswith(year)):
+                return cached
+            return None
+
+        if step == "imdb_id":
+            return self._series_for_episode(self.omdb.query_by_id(imdb_id))
+
+        if step == "title":
+            return self.omdb.query(title, year, media_type=media_type)
+
+        if step == "alt_type":
+            alt_type = "movie" if media_type == "series" else "series"
+            return self.omdb.query(title, year, media_type=alt_type)
+
+        if step == "search":
+            results = self.omdb.search(title)
+            best = self._best_listing(title, year, results)
+            return self._series_for_episode(self.omdb.query_by_id(best["imdbID"])) if best else None
+
+        return None
+
+    def _series_for_episode(self, result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """An .nfo may cite an episode's id; the library folder is named after its series."""
+        if not result or result.get("Type") != "episode":
+            return result
+        series_id = result.get("seriesID")
+        if not series_id or series_id == "N/A":
+            self.logger.debug(f"Episode id {result.get('imdbID')} has no series id; skipping it")
+            return None
+        self.logger.debug(f"{result.get('imdbID')} is an episode; following to series {series_id}")
+        return self.omdb.query_by_id(series_id)
+
+    def _best_listing(self, title: str, year: Optional[str], results: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
+        """Pick the closest title from a typeless listing, preferring a matching year."""
+        names = [item.get("Title", "") for item in results]
+        close = set(difflib.get_close_matches(title, names, n=len(names) or 1, cutoff=0.6))
+        candidates = [item for item in results if item.get("Title") in close and item.get("imdbID")]
+        if not candidates:
+            return None
+        if year:
+            same_year = [item for item in candidates if str(item.get("Year", "")).startswith(year)]
+            candidates = same_year or candidates
+        return max(candidates, key=lambda item: difflib.SequenceMatcher(None, title.lower(), item["Title"].lower()).ratio())
+
+    def _record(self, step: str, media_type: str, success: bool):
+        s = self.stats.setdefault(f"{media_type}:{step}", {"attempts": 0, "hits": 0})
+        s["attempts"] += 1
+        if success:
+            s["hits"] += 1
+
+    def _remember(self, title: str, result: Dict[str, Any]):
+        for name in {title, result.get("Title", "")}:
+            if name:
+                self.cache[cache_key(name)] = result
+        if result.get("imdbID"):
+            self.by_id[result["imdbID"]] = result
+
+        while len(self.cache) > MAX_CACHE_ENTRIES:
+            self.cache.pop(next(iter(self.cache)))
+
+        self._save_json(self.cache_path, self.cache)
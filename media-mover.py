@@ -33,7 +33,13 @@ def main():
         signal.signal(signal.SIGTERM, handle_shutdown)
 
         # Init components
-        omdb = OMDbClient(config.omdb_api_key, config.omdb_api_url, config.api_timeout, logger)
+        omdb = OMDbClient(
+            config.omdb_api_key, config.omdb_api_url, config.api_timeout, logger,
+            hedge_percentile=config.hedge_percentile,
+            hedge_min_delay=config.hedge_min_delay,
+            secondary_url=config.omdb_secondary_url or None,
+            secondary_key=config.omdb_secondary_key or None
+        )
         handler = MediaHandler(config, logger)
         scanner = MediaScanner(config, logger, omdb, handler)
         scanner.set_shutdown_callback(lambda: shutdown_requested)
@@ -43,13 +49,25 @@ def main():
 
         # Main loop
         logger.info(f"Polling every {config.scan_interval}s")
+        last_reconcile = None
         while not shutdown_requested:
             scanner.scan_uploads()
+            if config.reconcile_interval and (last_reconcile is None or time.monotonic() - last_reconcile >= config.reconcile_interval):
+                handler.reconcile()
+                last_reconcile = time.monotonic()
             for _ in range(config.scan_interval):
                 if shutdown_requested:
                     break
                 time.sleep(1)
 
+        scanner.close()
+
+        report = omdb.latency_report()
+        if report["samples"]:
+            logger.info(
+                f"OMDb lookup latency p50={report['p50']:.2f}s p99={report['p99']:.2f}s "
+                f"({report['samples']} lookups, {report['hedged']} hedged)"
+            )
         logger.info("Shutdown complete.")
 
     except Exception as e:
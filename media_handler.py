@@ -6,6 +6,21 @@ import logging
 import re
 
 from media_parser import sanitize_name
+from ingest_manifest import subtitle_target, extra_target
+from move_engine import MoveEngine, MoveInterrupted, ChecksumMismatch
+from move_scheduler import MoveScheduler, NeedsCopy
+from io_qos import IoPolicy
+from processed_ledger import ProcessedLedger
+from library_index import LibraryIndex
+from collision import compare, IDENTICAL, BETTER, WORSE
+from content_index import ContentIndex
+from library_catalog import LibraryCatalog
+from reconciler import Reconciler
+from library_placement import LibraryPlacement
+from content_hash import sample_hash
+
+def _is_under(path: str, directory: str) -> bool:
+    return os.path.abspath(path).startswith(os.path.abspath(directory).rstrip(os.sep) + os.sep)
 
 class MediaHandler:
     def __init__(self, config, logger: logging.Logger):
@@ -17,7 +32,131 @@ class MediaHandler:
             self.logger.warning("Missing 'duplicate_dir' in config — defaulting to 'unknown_dir'")
             setattr(self.config, "duplicate_dir", self.config.unknown_dir)
 
-    def construct_path(self, original_name: str, media_info: Dict[str, str], is_tv: bool) -> str:
+        self.leftover_policy = getattr(self.config, "leftover_policy", "unknown").lower()
+        self.tv_roots = getattr(self.config, "tv_dirs", None) or [self.config.tv_dir]
+        self.movie_roots = getattr(self.config, "movies_dirs", None) or [self.config.movies_dir]
+        self.library_roots = self.tv_roots + self.movie_roots + [
+            getattr(self.config, "movies_kids_dir", ""), getattr(self.config, "music_dir", "")
+        ]
+        self.index = LibraryIndex(
+            self.library_roots,
+            self.logger,
+            workers=getattr(self.config, "index_workers", 16),
+            watch=getattr(self.config, "use_inotify", False)
+        )
+        self.index.build()
+        catalog_file = getattr(self.config, "catalog_file", "")
+        self.catalog = LibraryCatalog(catalog_file, self.logger) if catalog_file else None
+        self.content = ContentIndex(self.logger, self.catalog)
+        self.reconciler = Reconciler(self.catalog, self.library_roots, self.logger, self.index) if self.catalog else None
+        if self.catalog:
+            summary = self.catalog.summary()
+            self.logger.info(f"Library catalog: {summary['items']} files ({summary['bytes'] / 1e9:.1f} GB)")
+        self.policy = IoPolicy(
+            bandwidth_limit=getattr(self.config, "move_bandwidth_limit", 0),
+            prime_time_limit=getattr(self.config, "prime_time_limit", 0),
+            prime_time=getattr(self.config, "prime_time_windows", ""),
+            offpeak=getattr(self.config, "offpeak_windows", ""),
+            defer_above=getattr(self.config, "defer_copies_above", 0),
+        )
+        self.engine = MoveEngine(
+            self.logger,
+            policy=self.policy,
+            hash_copies=getattr(self.config, "hash_copies", True),
+            verify_copies=getattr(self.config, "verify_copies", False),
+            verify_renames=getattr(self.config, "verify_sfv_renames", False),
+            ensure_dir=self.index.ensure_dir
+        )
+        self.verify_sfv = getattr(self.config, "verify_sfv", True)
+        self.drop_lower_quality = getattr(self.config, "drop_lower_quality", False)
+        self.quarantine_dir = getattr(self.config, "quarantine_dir", "") or os.path.join(self.config.uploads_dir, "QUARANTINE")
+        self.scheduler = MoveScheduler(self.logger, concurrency=getattr(self.config, "move_concurrency", 1),
+                                       policy=self.policy, min_free=getattr(self.config, "min_free_space", 0),
+                                       may_clone=self.engine.may_clone)
+        # A fast-lane job that turns out to need a copy goes back through deferral and admission
+        self.engine.before_copy = self.scheduler.before_copy
+        # New items go to the root with the most room once in-flight copies are counted
+        self.placement = LibraryPlacement(self.index, self.logger, reserved=self.scheduler.reserved)
+
+        # Link mode leaves uploads in place and remembers what was ingested
+        self.ingest_mode = getattr(self.config, "ingest_mode", "move")
+        self.ledger = ProcessedLedger(self.config.ledger_file, self.logger) if self.ingest_mode == "link" else None
+
+    def set_shutdown_callback(self, callback):
+        """Let in-flight copies pause (and later resume) when shutdown is requested."""
+        self.engine.should_stop = callback
+        self.scheduler.should_stop = callback
+
+    def schedule_move(self, source_path: str, destination_path: str, work, reroute=None):
+        """Run work (which moves source_path) on the scheduler lane for the two devices involved.
+
+        reroute() returns another (destination, work) to try if the destination has no room.
+        """
+        return self.scheduler.submit(source_path, destination_path, work, reroute)
+
+    def is_busy(self, path: str) -> bool:
+        return self.scheduler.is_busy(path)
+
+    def close(self):
+        """Wait for scheduled moves; copies in progress pause at shutdown and resume next run."""
+        pending = self.scheduler.status()
+        if pending:
+            self.logger.info(f"Waiting for scheduled moves: {pending}")
+        self.scheduler.close(wait=True)
+        if self.ledger:
+            self.ledger.close()
+        if self.catalog:
+            self.catalog.close()
+        self.index.close()
+
+    def reconcile(self):
+        """Sync the catalog with changes made to the library by others."""
+        if not self.reconciler:
+            return
+        try:
+            self.reconciler.run()
+        except Exception as e:
+            self.logger.error(f"Library reconcile failed: {str(e)}")
+
+    def exists(self, path: str) -> bool:
+        """Existence check answered from the library index where it covers the path."""
+        return self.index.exists(path)
+
+    def keeps_source(self, path: str) -> bool:
+        """True when path is an upload that link mode must leave in place.
+
+        UNKNOWN, DUPLICATE and QUARANTINE may live under uploads, but they hold our
+        own parked items (not seeding), so those are moved as usual.
+        """
+        if not self.ledger or not _is_under(path, self.config.uploads_dir):
+            return False
+        parked = (self.config.unknown_dir, self.config.duplicate_dir, self.quarantine_dir)
+        return not any(_is_under(path, d) for d in parked if d)
+
+    def is_processed(self, path: str) -> bool:
+        return bool(self.ledger) and self.ledger.is_processed(path)
+
+    def transfer(self, source_path: str, destination_path: str, expect: Optional[Dict[str, str]] = None):
+        """Move source to destination, or link it and record it in the ledger in link mode."""
+        keep = self.keeps_source(source_path)
+        into_library = self.index.covers(destination_path) and os.path.isfile(source_path)
+        if into_library:
+            # Sample locally before the move; the copy itself supplies the full hash
+            size, sample = os.path.getsize(source_path), sample_hash(source_path)
+        result = self.engine.move(source_path, destination_path, keep_source=keep, expect=expect)
+        self.scheduler.committed()
+        self.index.add(destination_path)
+        if into_library:
+            result.size = result.size or size
+            if sample:
+                result.hashes["xxh64-sample"] = sample
+        if keep:
+            self.ledger.record(source_path, destination_path, result.method)
+        return result
+
+    def construct_path(self, original_name: str, media_info: Dict[str, str], is_tv: bool,
+                       source_path: Optional[str] = None) -> str:
+        """Library path for an item; with several roots per category, source_path steers the choice of root."""
         ext = os.path.splitext(original_name)[1].lower()
 
         if is_tv:
@@ -29,7 +168,7 @@ class MediaHandler:
             filename = f"{show_name} S{season}E{episode}{ep_range}{ext}"
 
             path = os.path.join(
-                self.config.tv_dir,
+                self.placement.root_for(self.tv_roots, show_name, source_path),
                 show_name,
                 f"Season {season}",
                 filename
@@ -41,9 +180,10 @@ class MediaHandler:
             movie_title = sanitize_name(media_info.get("Title", original_name))
             year = media_info.get("Year", "0000")
             filename = f"{movie_title} ({year}){ext}"
+            folder = f"{movie_title} ({year})"
             path = os.path.join(
-                self.config.movies_dir,
-                f"{movie_title} ({year})",
+                self.placement.root_for(self.movie_roots, folder, source_path),
+                folder,
                 filename
             )
             self.logger.debug(f"Constructed Movie path: {path}")
@@ -77,8 +217,12 @@ class MediaHandler:
 
             self.logger.debug(f"Moving {label.lower()} item from {item_path} to {target}")
             os.makedirs(destination_dir, exist_ok=True)
-            shutil.move(item_path, target)
+            self.transfer(item_path, target)
             self.logger.info(f"Moved to {label.upper()}: {target}")
+        except NeedsCopy:
+            raise
+        except MoveInterrupted as e:
+            self.logger.info(f"{str(e)} — will resume on next run")
         except Exception as e:
             self.logger.error(f"Failed to move to {label.upper()}: {str(e)}")
 
@@ -88,26 +232,191 @@ class MediaHandler:
     def move_to_duplicate(self, item_path: str):
         self.move_item(item_path, self.config.duplicate_dir, "DUPLICATE")
 
-    def move_to_target(self, source_path: str, destination_path: str) -> Optional[str]:
-        """Move file and return final destination path if moved."""
+    def move_to_quarantine(self, item_path: str):
+        self.move_item(item_path, self.quarantine_dir, "QUARANTINE")
+
+    def move_to_target(self, source_path: str, destination_path: str, media_info: Optional[Dict] = None,
+                       expect: Optional[Dict[str, str]] = None, quarantine: Optional[str] = None,
+                       replace: bool = False) -> Optional[str]:
+        """Move file and return final destination path if moved; copy integrity data goes into media_info.
+
+        If the bytes don't match expect, quarantine (default: the source) is parked in QUARANTINE.
+        With replace, an existing destination is swapped out atomically once the new copy is complete.
+        """
         if os.path.normpath(source_path) == os.path.normpath(destination_path):
             self.logger.debug("Source and destination are the same — skipping move.")
             return None
 
-        if os.path.exists(destination_path):
+        if self.exists(destination_path) and not replace:
             self.logger.warning(f"Destination already exists: {destination_path}")
             return None
 
         try:
             self.logger.debug(f"Moving file from {source_path} to {destination_path}")
-            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-            shutil.move(source_path, destination_path)
-            self.logger.info(f"Moved to: {destination_path}")
+            if replace and self.exists(destination_path):
+                result = self._replace(source_path, destination_path, expect)
+            else:
+                result = self.transfer(source_path, destination_path, expect)
+            self.logger.info(f"Moved to: {destination_path} [{result.method}, {result.elapsed:.2f}s]")
+            if media_info is not None and result.integrity():
+                media_info["integrity"] = result.integrity()
+            self._register(source_path, destination_path, result, media_info)
             return destination_path
+        except NeedsCopy:
+            raise
+        except MoveInterrupted as e:
+            self.logger.info(f"{str(e)} — will resume on next run")
+            return None
+        except FileExistsError as e:
+            # Created behind the index's back; remember it for next time
+            self.index.add(destination_path)
+            self.logger.warning(f"Destination already exists: {str(e)}")
+            return None
+        except ChecksumMismatch as e:
+            self.logger.error(f"Corrupt download, not publishing: {str(e)}")
+            try:
+                os.rmdir(os.path.dirname(destination_path))  # only if it was created just for this item
+                self.index.remove(os.path.dirname(destination_path))
+            except OSError:
+                pass
+            self.move_to_quarantine(quarantine or source_path)
+            return None
         except Exception as e:
             self.logger.error(f"Error moving to target: {str(e)}")
             return None
 
+    def _replace(self, source_path: str, destination_path: str, expect: Optional[Dict[str, str]] = None):
+        """Place the new file beside the old one, then rename it over the old in one step."""
+        directory, name = os.path.split(destination_path)
+        staging = os.path.join(directory, f".{name}.incoming")
+        if os.path.lexists(staging):
+            os.unlink(staging)  # left by an interrupted upgrade; the source is still here to redo it
+        result = self.transfer(source_path, staging, expect)
+        os.replace(staging, destination_path)
+        self.index.remove(staging)
+        self.index.add(destination_path)
+        return result
+
+    def _register(self, source_path: str, destination_path: str, result, media_info: Optional[Dict] = None):
+        """Record a file placed in the library (catalog row, or the in-memory content index)."""
+        if "xxh64-sample" not in result.hashes:
+            return  # not a library file (or a whole folder)
+        sample, full = result.hashes["xxh64-sample"], result.hashes.get("xxh64")
+        if self.catalog:
+            try:
+                self.catalog.record(source_path, destination_path, media_info, result.size, sample, full, result.method)
+            except Exception as e:
+                self.logger.error(f"Failed to record {destination_path} in catalog: {str(e)}")
+        else:
+            self.content.add(destination_path, result.size, sample, full)
+
+    def find_duplicate(self, path: str) -> Optional[str]:
+        """Library file with the same content as path (e.g. a renamed re-upload), if any."""
+        duplicate = self.content.find(path)
+        if duplicate:
+            self.logger.info(f"{os.path.basename(path)} is already in the library as {duplicate}")
+        return duplicate
+
+    def resolve_collision(self, source_path: str, target_path: str, item_path: str, manifest=None) -> bool:
+        """Handle an incoming file whose target exists; True means publish it over the existing one."""
+        verdict = compare(source_path, target_path, self.logger)
+        if verdict == BETTER:
+            self.logger.info(f"Upgrading {target_path} with higher-resolution {os.path.basename(source_path)}")
+            return True
+        if verdict == IDENTICAL or (verdict == WORSE and self.drop_lower_quality):
+            self.drop_incoming(source_path, target_path, item_path, manifest, identical=verdict == IDENTICAL)
+        elif verdict == WORSE:
+            # The ranking rests on probed headers alone, so don't delete on it unless asked to
+            self.logger.warning(f"Destination exists with a higher-resolution copy, moving to DUPLICATE: {target_path}")
+            self.move_to_duplicate(item_path)
+        else:
+            self.logger.warning(f"Destination exists and the copies can't be ranked, moving to DUPLICATE: {target_path}")
+            self.move_to_duplicate(item_path)
+        return False
+
+    def drop_incoming(self, source_path: str, target_path: str, item_path: str, manifest=None, identical: bool = False):
+        """Discard an incoming copy the library doesn't need (link mode: leave it and remember it)."""
+        reason = "identical to" if identical else "lower resolution than"
+        try:
+            if self.keeps_source(item_path):
+                if identical and os.stat(source_path).st_dev == os.stat(target_path).st_dev:
+                    # Share the bytes: the library entry becomes a hardlink to the seeding file
+                    temp = os.path.join(os.path.dirname(target_path), f".{os.path.basename(target_path)}.link")
+                    if os.path.lexists(temp):
+                        os.unlink(temp)
+                    os.link(source_path, temp)
+                    os.replace(temp, target_path)
+                    if self.catalog:
+                        self.catalog.refresh_stat(target_path)
+                    self.logger.info(f"Relinked {target_path} to identical upload {source_path}")
+                self.ledger.record(source_path, target_path, "duplicate")
+                self.logger.info(f"Leaving {source_path} in place ({reason} {target_path})")
+            else:
+                extras = (manifest.subtitles + manifest.extras) if manifest else []
+                for path in [source_path] + extras:
+                    os.unlink(path)
+                self.logger.info(f"Dropped {source_path} ({reason} {target_path})")
+        except OSError as e:
+            self.logger.error(f"Failed to drop {source_path}: {str(e)}")
+            return
+
+        if manifest:
+            self.dispose_leftovers(manifest)
+
+    def publish_manifest(self, manifest, destination_path: str, media_info: Optional[Dict] = None,
+                         replace: bool = False) -> Optional[str]:
+        """Move a release's main file with its subtitles and extras; dispose of the rest per policy."""
+        self.logger.info(f"Ingest manifest for {manifest.folder}: {manifest.summary()}")
+        expected = manifest.expected if self.verify_sfv else (lambda path: None)
+        # A corrupt main file takes the whole release to QUARANTINE
+        final_path = self.move_to_target(manifest.main, destination_path, media_info,
+                                         expect=expected(manifest.main), quarantine=manifest.folder, replace=replace)
+        if not final_path:
+            return None
+
+        failed = []
+        for subtitle in manifest.subtitles:
+            # On an upgrade the old release's sidecars sit at the same names; replace them too
+            if not self.move_to_target(subtitle, subtitle_target(subtitle, manifest.main, final_path),
+                                       expect=expected(subtitle), replace=replace):
+                failed.append(subtitle)
+        for extra in manifest.extras:
+            if not self.move_to_target(extra, extra_target(extra, final_path), expect=expected(extra), replace=replace):
+                failed.append(extra)
+
+        self.dispose_leftovers(manifest, failed)
+        return final_path
+
+    def dispose_leftovers(self, manifest, failed=None):
+        """Remove or park what is left of a release folder once nothing publishable remains.
+
+        failed lists wanted files (subtitles, extras) that could not be published;
+        a folder still holding any is parked in UNKNOWN rather than deleted.
+        """
+        if manifest.pending:
+            self.logger.info(f"Leaving {len(manifest.pending)} further feature(s) in {manifest.folder} for the next pass")
+            return
+
+        if self.keeps_source(manifest.folder):
+            self.ledger.record(manifest.folder, method="manifest")
+            self.logger.info(f"Link mode — leaving {len(manifest.leftover)} leftover file(s) of {manifest.folder} in place")
+            return
+
+        if failed and self.leftover_policy == "delete":
+            self.logger.warning(
+                f"{len(failed)} subtitle/extra file(s) of {manifest.folder} were not published "
+                f"— moving the folder to UNKNOWN instead of deleting it"
+            )
+            self.move_to_unknown(manifest.folder)
+        elif self.leftover_policy == "delete":
+            try:
+                shutil.rmtree(manifest.folder)
+                self.logger.info(f"Deleted leftovers of {manifest.folder}")
+            except Exception as e:
+                self.logger.error(f"Failed to delete leftovers of {manifest.folder}: {str(e)}")
+        else:
+            self.move_to_unknown(manifest.folder)
+
     def write_sidecar_metadata(self, destination_path: str, metadata: Dict[str, str]):
         """Generate .json metadata next to the actual media file."""
         try:
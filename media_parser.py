@@ -1,13 +1,60 @@
-from guessit import guessit
-from typing import Optional, Tuple, Dict
+from guessit import guessit, __version__ as GUESSIT_VERSION
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Dict, Any, List, Iterable
 from unicodedata import normalize
+import os
 import re
+import json
+import sqlite3
+import threading
 
-# --- Primary Regex for TV Episode Matching ---
-TV_PATTERN = re.compile(
-    r'(?P<title>.+?)[.\s_\-\[\(]*[Ss](?P<season>\d{1,2})[Ee](?P<episode>\d{2})(?:[-E]?(?P<end_episode>\d{2}))?[\]\).\s_\-]*',
+# Bump whenever parsing rules change so cached results are re-parsed
+PARSER_VERSION = f"3/guessit-{GUESSIT_VERSION}"
+
+# --- Fast path: standard scene naming parsed without guessit ---
+KNOWN_EXTS = {".mkv", ".mp4", ".avi", ".mov", ".flac", ".mp3", ".m4v", ".ts", ".srt", ".ass", ".sub"}
+
+FAST_TV_PATTERN = re.compile(
+    r'^(?P<title>.+?)[. _-]+S(?P<season>\d{1,2})(?P<episodes>(?:-?E\d{1,3})+)(?:[. _-]+(?P<rest>.*))?$',
+    re.IGNORECASE
+)
+FAST_MOVIE_PATTERN = re.compile(
+    r'^(?P<title>.+?)[. _(\[]+(?P<year>(?:19|20)\d{2})[)\]]?(?:[. _-]+(?P<rest>.*))?$'
+)
+EPISODE_NUMBER_PATTERN = re.compile(r'E(\d{1,3})', re.IGNORECASE)
+TRAILING_YEAR_PATTERN = re.compile(r'^(?P<title>.+?) (?P<year>(?:19|20)\d{2})$')
+YEAR_TOKEN_PATTERN = re.compile(r'^(?:19|20)\d{2}$')
+# Tag boundaries: \b would not split on '_' (Show_S01E01_1080p_WEB-DL)
+RESOLUTION_PATTERN = re.compile(r'(?<![A-Za-z0-9])(\d{3,4}[pi])(?![A-Za-z0-9])', re.IGNORECASE)
+ACRONYM_PATTERN = re.compile(r'(?:^|[. _])[A-Za-z]\.[A-Za-z]\.')
+RELEASE_GROUP_PATTERN = re.compile(r'-[A-Za-z0-9]+$')
+
+SOURCE_PATTERNS = [
+    (re.compile(r'(?<![A-Za-z0-9])(?:blu-?ray|bd-?rip|br-?rip|bdremux)(?![A-Za-z0-9])', re.IGNORECASE), "Blu-ray"),
+    (re.compile(r'(?<![A-Za-z0-9])web(?:-?dl|-?rip)?(?![A-Za-z0-9])', re.IGNORECASE), "Web"),
+    (re.compile(r'(?<![A-Za-z0-9])hdtv(?![A-Za-z0-9])', re.IGNORECASE), "HDTV"),
+    (re.compile(r'(?<![A-Za-z0-9])dvd(?:-?rip)?(?![A-Za-z0-9])', re.IGNORECASE), "DVD"),
+]
+
+# Release tags the fast path understands; anything else lowers its confidence
+KNOWN_TAGS = {
+    "4k", "uhd", "hdr", "hdr10", "dv", "10bit", "8bit", "sdr",
+    "bluray", "blu", "ray", "bdrip", "brrip", "bdremux", "remux", "web", "dl", "webdl", "webrip", "rip",
+    "hdtv", "dvd", "dvdrip",
+    "x264", "x265", "h264", "h265", "hevc", "avc", "xvid", "divx",
+    "aac", "ac3", "dd", "dd5", "ddp", "ddp5", "dts", "truehd", "atmos", "flac", "mp3",
+    "amzn", "nf", "dsnp", "hmax", "hulu", "atvp", "max",
+    "proper", "repack", "internal", "extended", "unrated", "remastered", "limited", "multi", "subbed", "dubbed",
+}
+FIRST_TAG_PATTERN = re.compile(
+    r'(?:^|[. _])(?:\d{3,4}[pi]|' + "|".join(sorted(KNOWN_TAGS, key=len, reverse=True)) + r')(?:[. _\-]|$)',
     re.IGNORECASE
 )
+FAST_PATH_MIN_CONFIDENCE = 0.8
+
+# --- IMDb ids as found in release .nfo files and IMDb URLs ---
+IMDB_ID_PATTERN = re.compile(r'(?<![a-z0-9])(tt\d{7,8})(?!\d)', re.IGNORECASE)
 
 def sanitize_name(text: str) -> str:
     """Convert to ASCII, remove special chars, normalize spacing."""
@@ -15,32 +62,332 @@ def sanitize_name(text: str) -> str:
     text = re.sub(r'[^\w\s-]', '', text).strip()
     return re.sub(r'[._-]+', ' ', text).strip()
 
-def parse_media_title(raw_name: str) -> Tuple[str, Optional[str]]:
-    """Extract clean title and optional year using guessit."""
+class ParsedMedia:
+    """Everything the pipeline needs from a filename, produced by one guessit pass."""
+
+    __slots__ = ("title", "year", "type", "season", "episode", "end_episode", "resolution", "source")
+
+    def __init__(self, title: str, year: Optional[str] = None, type: str = "movie",
+                 season: Optional[str] = None, episode: Optional[str] = None, end_episode: Optional[str] = None,
+                 resolution: Optional[str] = None, source: Optional[str] = None):
+        self.title = title
+        self.year = year
+        self.type = type
+        self.season = season
+        self.episode = episode
+        self.end_episode = end_episode
+        self.resolution = resolution
+        self.source = source
+
+    @property
+    def is_tv(self) -> bool:
+        return self.type == "episode"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name) is not None)
+        return f"ParsedMedia({fields})"
+
+def _first(value):
+    return value[0] if isinstance(value, list) else value
+
+def _padded(value) -> Optional[str]:
+    return str(value).zfill(2) if value is not None else None
+
+class ParseCache:
+    """Bounded LRU of parse results, optionally backed by a SQLite file."""
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, ParsedMedia]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.version = PARSER_VERSION + ("+fast" if _fast_path_enabled else "")
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")  # disposable data; losing a write only costs a re-parse
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "name TEXT NOT NULL, version TEXT NOT NULL, record TEXT NOT NULL, PRIMARY KEY (name, version))"
+            )
+            self._db.execute("DELETE FROM parse_cache WHERE version != ?", (self.version,))
+            self._db.commit()
+
+    def get(self, raw_name: str) -> Optional[ParsedMedia]:
+        with self._lock:
+            parsed = self._entries.get(raw_name)
+            if parsed is not None:
+                self._entries.move_to_end(raw_name)
+                self.hits += 1
+                return parsed
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT record FROM parse_cache WHERE name = ? AND version = ?", (raw_name, self.version)
+                ).fetchone()
+                if row:
+                    parsed = ParsedMedia(**json.loads(row[0]))
+                    self._remember(raw_name, parsed)
+                    self.hits += 1
+                    return parsed
+
+            self.misses += 1
+            return None
+
+    def put(self, raw_name: str, parsed: ParsedMedia):
+        with self._lock:
+            self._remember(raw_name, parsed)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (name, version, record) VALUES (?, ?, ?)",
+                    (raw_name, self.version, json.dumps(parsed.to_dict()))
+                )
+                self._db.commit()
+
+    def put_many(self, items: Iterable[Tuple[str, ParsedMedia]]):
+        """Store a batch of results with a single commit."""
+        items = list(items)
+        with self._lock:
+            for raw_name, parsed in items:
+                self._remember(raw_name, parsed)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO parse_cache (name, version, record) VALUES (?, ?, ?)",
+                    [(raw_name, self.version, json.dumps(parsed.to_dict())) for raw_name, parsed in items]
+                )
+                self._db.commit()
+
+    def _remember(self, raw_name: str, parsed: ParsedMedia):
+        self._entries[raw_name] = parsed
+        self._entries.move_to_end(raw_name)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+_fast_path_enabled = True
+_parse_cache = ParseCache()
+
+def configure_parse_cache(path: Optional[str] = None, maxsize: int = 4096) -> ParseCache:
+    """Replace the module parse cache, e.g. to add persistence from config."""
+    global _parse_cache
+    _parse_cache.close()
+    _parse_cache = ParseCache(path, maxsize)
+    return _parse_cache
+
+def parse_media(raw_name: str) -> ParsedMedia:
+    """Parse a filename into a ParsedMedia record, consulting the parse cache first."""
+    parsed = _parse_cache.get(raw_name)
+    if parsed is None:
+        parsed = _parse_tiered(raw_name)
+        _parse_cache.put(raw_name, parsed)
+    return parsed
+
+def _init_parse_worker(fast_path: bool):
+    """Process pool initializer: match the parent's mode and build guessit's rules once."""
+    set_fast_path(fast_path)
+    guessit("Warm.Up.S01E01.720p.mkv")
+
+def _parse_chunk(names: List[str]) -> List[ParsedMedia]:
+    return [_parse_tiered(name) for name in names]
+
+def parse_many(names: Iterable[str], workers: Optional[int] = None, chunksize: int = 256,
+               max_tasks_per_child: int = 50) -> List[ParsedMedia]:
+    """Parse many names across a process pool; results come back in input order.
+
+    Cached names are answered in-process. Misses are submitted in chunks, and each
+    worker is replaced after max_tasks_per_child chunks to cap guessit's memory growth.
+    """
+    names = list(names)
+    results: List[Optional[ParsedMedia]] = [None] * len(names)
+    pending: Dict[str, List[int]] = {}
+    for index, name in enumerate(names):
+        cached = _parse_cache.get(name)
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.setdefault(name, []).append(index)
+
+    unique = list(pending)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(unique) <= chunksize:
+        parsed = _parse_chunk(unique)
+    else:
+        chunks = [unique[i:i + chunksize] for i in range(0, len(unique), chunksize)]
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            initializer=_init_parse_worker,
+            initargs=(_fast_path_enabled,),
+            max_tasks_per_child=max_tasks_per_child
+        ) as pool:
+            parsed = [record for chunk in pool.map(_parse_chunk, chunks) for record in chunk]
+
+    _parse_cache.put_many(zip(unique, parsed))
+    for name, record in zip(unique, parsed):
+        for index in pending[name]:
+            results[index] = record
+    return results
+
+def set_fast_path(enabled: bool):
+    """Enable or disable the regex fast path (guessit handles everything when off)."""
+    global _fast_path_enabled
+    _fast_path_enabled = enabled
+
+def _parse_tiered(raw_name: str) -> ParsedMedia:
+    if _fast_path_enabled:
+        fast = parse_fast(raw_name)
+        if fast and fast[1] >= FAST_PATH_MIN_CONFIDENCE:
+            return fast[0]
+    return _parse_with_guessit(raw_name)
+
+def _unknown_tags(text: str) -> list:
+    tokens = [t for t in re.split(r'[. _\-\[\]()]+', text.lower()) if t]
+    return [t for t in tokens if t not in KNOWN_TAGS and not RESOLUTION_PATTERN.fullmatch(t) and not t.isdigit()]
+
+def parse_fast(raw_name: str) -> Optional[Tuple[ParsedMedia, float]]:
+    """Parse standard scene names with precompiled patterns; returns (record, confidence) or None."""
+    base, ext = os.path.splitext(raw_name)
+    name = base if ext.lower() in KNOWN_EXTS else raw_name
+
+    tv = FAST_TV_PATTERN.match(name)
+    movie = None if tv else FAST_MOVIE_PATTERN.match(name)
+    match = tv or movie
+    if not match:
+        return None
+
+    raw_title = match.group("title")
+    rest = match.group("rest") or ""
+    confidence = 1.0
+
+    title = re.sub(r'[._]+', ' ', raw_title).strip(" -")
+    year = movie.group("year") if movie else None
+    if tv:
+        trailing = TRAILING_YEAR_PATTERN.match(title)
+        if trailing:
+            title, year = trailing.group("title"), trailing.group("year")
+
+    if sum(c.isalnum() for c in title) < 2:
+        return None
+    if ACRONYM_PATTERN.search(raw_title):
+        confidence -= 0.5
+    if any(t.lower() in KNOWN_TAGS or RESOLUTION_PATTERN.fullmatch(t) for t in title.split()):
+        confidence -= 0.5
+
+    release = RELEASE_GROUP_PATTERN.sub("", rest)
+    if movie:
+        if any(YEAR_TOKEN_PATTERN.match(t) for t in re.split(r'[. _]+', release)):
+            confidence -= 0.5  # e.g. Blade.Runner.2049.2017 - which year is the title?
+        confidence -= 0.15 * len(_unknown_tags(release))
+    else:
+        # Words before the first release tag are the episode title
+        first_tag = FIRST_TAG_PATTERN.search(release)
+        tags = release[first_tag.start():] if first_tag else ""
+        confidence -= 0.15 * len(_unknown_tags(tags))
+
+    season = episode = end_episode = None
+    if tv:
+        numbers = [int(n) for n in EPISODE_NUMBER_PATTERN.findall(match.group("episodes"))]
+        season = _padded(int(match.group("season")))
+        episode = _padded(numbers[0])
+        end_episode = _padded(numbers[-1]) if numbers[-1] != numbers[0] else None
+
+    resolution = RESOLUTION_PATTERN.search(release)
+    source = next((label for pattern, label in SOURCE_PATTERNS if pattern.search(release)), None)
+    if source == "Blu-ray" and (re.search(r'(?<![A-Za-z0-9])(?:2160p|uhd|4k)(?![A-Za-z0-9])', release, re.IGNORECASE)):
+        source = "Ultra HD Blu-ray"
+
+    parsed = ParsedMedia(
+        title=title,
+        year=year,
+        type="episode" if tv else "movie",
+        season=season,
+        episode=episode,
+        end_episode=end_episode,
+        resolution=resolution.group(1).lower() if resolution else None,
+        source=source
+    )
+    return parsed, max(confidence, 0.0)
+
+def cross_check(names) -> Dict[str, Any]:
+    """Compare confident fast-path results against guessit; returns an agreement report."""
+    report = {"total": 0, "fast_confident": 0, "agree": 0, "field_mismatches": {}, "examples": []}
+    for name in names:
+        report["total"] += 1
+        fast = parse_fast(name)
+        if not fast or fast[1] < FAST_PATH_MIN_CONFIDENCE:
+            continue
+        report["fast_confident"] += 1
+
+        slow = _parse_with_guessit(name)
+        mismatched = [
+            field for field in ParsedMedia.__slots__
+            if str(getattr(fast[0], field) or "").lower() != str(getattr(slow, field) or "").lower()
+        ]
+        if not mismatched:
+            report["agree"] += 1
+            continue
+        for field in mismatched:
+            report["field_mismatches"][field] = report["field_mismatches"].get(field, 0) + 1
+        if len(report["examples"]) < 20:
+            report["examples"].append({"name": name, "fast": fast[0].to_dict(), "guessit": slow.to_dict()})
+
+    confident = report["fast_confident"]
+    report["agreement"] = report["agree"] / confident if confident else 1.0
+    report["coverage"] = confident / report["total"] if report["total"] else 0.0
+    return report
+
+def _parse_with_guessit(raw_name: str) -> ParsedMedia:
+    """Parse a filename once with guessit into a ParsedMedia record."""
     try:
         guess = guessit(raw_name)
-        title = guess.get('title')
-        year = guess.get('year')
-        return title, str(year) if year else None
     except Exception:
-        return raw_name, None
-
-def is_tv_show(name: str) -> bool:
-    """Detect common TV show patterns in filename."""
-    return bool(re.search(
-        r'[Ss]\d{1,2}[Ee]\d{1,2}(?:[-E]?\d{1,2})?|Season[._ ]?\d{1,2}[._ ]?Episode[._ ]?\d{1,2}',
-        name, re.IGNORECASE
-    ))
-
-def get_tv_show_info(name: str) -> Optional[Dict[str, str]]:
-    """Extract season, episode, and optional range from filename."""
-    match = TV_PATTERN.search(name)
-    if match:
-        return {
-            "title": sanitize_name(match.group("title")),
-            "season": match.group("season").zfill(2),
-            "episode": match.group("episode").zfill(2),
-            "end_episode": match.group("end_episode").zfill(2) if match.group("end_episode") else None
-        }
-    return None
+        return ParsedMedia(raw_name)
+
+    episodes = guess.get('episode')
+    if isinstance(episodes, list):
+        first_episode, last_episode = episodes[0], episodes[-1]
+    else:
+        first_episode, last_episode = episodes, None
+
+    year = guess.get('year')
+    return ParsedMedia(
+        title=guess.get('title') or os.path.splitext(raw_name)[0],
+        year=str(_first(year)) if year else None,
+        type="episode" if guess.get('type') == 'episode' and first_episode is not None else "movie",
+        season=_padded(_first(guess.get('season'))) or ("01" if first_episode is not None else None),
+        episode=_padded(first_episode),
+        end_episode=_padded(last_episode) if last_episode != first_episode else None,
+        resolution=guess.get('screen_size'),
+        source=_first(guess.get('source'))
+    )
+
+def parse_media_title(raw_name: str) -> Tuple[str, Optional[str]]:
+    """Extract clean title and optional year using guessit."""
+    parsed = parse_media(raw_name)
+    return parsed.title, parsed.year
+
+def extract_imdb_id(text: str) -> Optional[str]:
+    """Return the first IMDb id (ttNNNNNNN) found in text, if any."""
+    match = IMDB_ID_PATTERN.search(text)
+    return match.group(1).lower() if match else None
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="media_parser utilities")
+    arg_parser.add_argument("--cross-check", metavar="FILE", required=True,
+                            help="File with one release name per line; reports fast path vs guessit agreement")
+    args = arg_parser.parse_args()
 
+    with open(args.cross_check, "r", encoding="utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    print(json.dumps(cross_check(corpus), indent=2))
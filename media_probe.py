@@ -0,0 +1,366 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, BinaryIO, Tuple
+
+# --- Matroska / EBML element ids ---
+EBML_HEADER = 0x1A45DFA3
+MKV_SEGMENT = 0x18538067
+MKV_SEEKHEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+
+# Header elements are small; anything bigger than this is not worth reading
+MAX_ELEMENT_READ = 1024 * 1024
+MP4_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+CODEC_NAMES = {
+    # Matroska codec ids
+    "V_MPEG4/ISO/AVC": "h264", "V_MPEGH/ISO/HEVC": "hevc", "V_AV1": "av1", "V_VP9": "vp9", "V_VP8": "vp8",
+    "V_MPEG4/ISO/ASP": "mpeg4", "V_MPEG2": "mpeg2",
+    "A_AAC": "aac", "A_AC3": "ac3", "A_EAC3": "eac3", "A_DTS": "dts", "A_TRUEHD": "truehd",
+    "A_OPUS": "opus", "A_FLAC": "flac", "A_MPEG/L3": "mp3", "A_VORBIS": "vorbis",
+    # MP4 sample entry / AVI handler fourccs
+    "avc1": "h264", "avc3": "h264", "hvc1": "hevc", "hev1": "hevc", "av01": "av1", "mp4v": "mpeg4",
+    "mp4a": "aac", "ac-3": "ac3", "ec-3": "eac3", "Opus": "opus", "fLaC": "flac",
+    "xvid": "mpeg4", "divx": "mpeg4", "dx50": "mpeg4", "fmp4": "mpeg4", "h264": "h264", "x264": "h264",
+}
+AVI_AUDIO_FORMATS = {0x55: "mp3", 0x2000: "ac3", 0x2001: "dts", 0xFF: "aac", 0x1: "pcm"}
+
+PROBE_CACHE_SIZE = 4096
+
+class ProbeResult:
+    """Container facts read from a media file's headers."""
+
+    __slots__ = ("container", "duration", "width", "height", "video_codec", "audio_codec",
+                 "video_streams", "audio_streams", "subtitle_streams", "bytes_read")
+
+    def __init__(self, container: str):
+        self.container = container
+        self.duration: Optional[float] = None
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.video_codec: Optional[str] = None
+        self.audio_codec: Optional[str] = None
+        self.video_streams = 0
+        self.audio_streams = 0
+        self.subtitle_streams = 0
+        self.bytes_read = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if name != "bytes_read"}
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name) is not None)
+        return f"ProbeResult({fields})"
+
+def codec_name(raw: str) -> str:
+    if raw in CODEC_NAMES:
+        return CODEC_NAMES[raw]
+    base = raw.split("/")[0]
+    return CODEC_NAMES.get(base, CODEC_NAMES.get(raw.lower(), raw.strip().lower()))
+
+class _Reader:
+    """Seekable reader that counts the bytes actually pulled from disk."""
+
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.bytes_read = 0
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        self.f.seek(offset)
+        data = self.f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+# --- Matroska ---
+
+def _vint(data: bytes, pos: int, keep_marker: bool) -> Tuple[Optional[int], int]:
+    """Decode an EBML variable-length integer; returns (value, new position)."""
+    if pos >= len(data):
+        return None, pos
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or pos + length > len(data):
+        return None, pos
+
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = value == mask - 1
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+        all_ones = all_ones and b == 0xFF
+    if not keep_marker and all_ones:
+        return -1, pos + length  # unknown size
+    return value, pos + length
+
+def _ebml_children(data: bytes):
+    pos = 0
+    while pos < len(data):
+        element_id, pos = _vint(data, pos, keep_marker=True)
+        size, pos = _vint(data, pos, keep_marker=False)
+        if element_id is None or size is None or size < 0:
+            return
+        yield element_id, data[pos:pos + size]
+        pos += size
+
+def _uint(data: bytes) -> int:
+    return int.from_bytes(data, "big") if data else 0
+
+def _probe_mkv(r: _Reader, file_size: int) -> Optional[ProbeResult]:
+    head = r.read_at(0, 64)
+    _, pos = _vint(head, 0, keep_marker=True)
+    size, pos = _vint(head, pos, keep_marker=False)
+    if size is None or size < 0:
+        return None
+    offset = pos + size
+
+    # Locate the Segment and remember where its payload starts
+    header = r.read_at(offset, 16)
+    element_id, pos = _vint(header, 0, keep_marker=True)
+    if element_id != MKV_SEGMENT:
+        return None
+    _, pos = _vint(header, pos, keep_marker=False)
+    segment_start = offset + pos
+
+    result = ProbeResult("matroska")
+    wanted = {MKV_INFO: None, MKV_TRACKS: None}
+    seek_positions: Dict[int, int] = {}
+
+    offset = segment_start
+    while offset < file_size and any(v is None for v in wanted.values()):
+        header = r.read_at(offset, 12)
+        element_id, pos = _vint(header, 0, keep_marker=True)
+        size, pos = _vint(header, pos, keep_marker=False)
+        if element_id is None or size is None or size < 0:
+            break
+        body_offset = offset + pos
+
+        if element_id in wanted or element_id == MKV_SEEKHEAD:
+            body = r.read_at(body_offset, min(size, MAX_ELEMENT_READ))
+            if element_id == MKV_SEEKHEAD:
+                for child_id, seek in _ebml_children(body):
+                    if child_id != MKV_SEEK:
+                        continue
+                    fields = dict(_ebml_children(seek))
+                    target, _ = _vint(fields.get(MKV_SEEK_ID, b""), 0, keep_marker=True)
+                    if target in wanted:
+                        seek_positions[target] = segment_start + _uint(fields.get(MKV_SEEK_POSITION, b""))
+            else:
+                wanted[element_id] = body
+        elif element_id == MKV_CLUSTER:
+            break  # media data starts; remaining headers can only be found via the SeekHead
+        offset = body_offset + size
+
+    # Headers placed after the clusters (e.g. some muxers put Tracks at the end)
+    for element_id, position in seek_positions.items():
+        if wanted[element_id] is None:
+            header = r.read_at(position, 12)
+            found_id, pos = _vint(header, 0, keep_marker=True)
+            size, pos = _vint(header, pos, keep_marker=False)
+            if found_id == element_id and size is not None and size >= 0:
+                wanted[element_id] = r.read_at(position + pos, min(size, MAX_ELEMENT_READ))
+
+    if wanted[MKV_INFO]:
+        info = dict(_ebml_children(wanted[MKV_INFO]))
+        scale = _uint(info.get(MKV_TIMECODE_SCALE, b"")) or 1_000_000
+        raw = info.get(MKV_DURATION)
+        if raw and len(raw) in (4, 8):
+            ticks = struct.unpack(">f" if len(raw) == 4 else ">d", raw)[0]
+            result.duration = round(ticks * scale / 1e9, 3)
+
+    for child_id, entry in _ebml_children(wanted[MKV_TRACKS] or b""):
+        if child_id != MKV_TRACK_ENTRY:
+            continue
+        fields = dict(_ebml_children(entry))
+        track_type = _uint(fields.get(MKV_TRACK_TYPE, b""))
+        codec = codec_name(fields.get(MKV_CODEC_ID, b"").decode("ascii", "replace").rstrip("\x00"))
+        if track_type == 1:
+            result.video_streams += 1
+            if result.video_codec is None:
+                result.video_codec = codec
+                video = dict(_ebml_children(fields.get(MKV_VIDEO, b"")))
+                result.width = _uint(video.get(MKV_PIXEL_WIDTH, b"")) or None
+                result.height = _uint(video.get(MKV_PIXEL_HEIGHT, b"")) or None
+        elif track_type == 2:
+            result.audio_streams += 1
+            result.audio_codec = result.audio_codec or codec
+        elif track_type == 17:
+            result.subtitle_streams += 1
+
+    return result
+
+# --- MP4 / MOV ---
+
+def _mp4_boxes(r: _Reader, start: int, end: int):
+    """Yield (type, body offset, body size) for boxes between start and end, reading only headers."""
+    offset = start
+    while offset + 8 <= end:
+        header = r.read_at(offset, 16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1 and len(header) >= 16:
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, size - header_size
+        offset += size
+
+def _probe_mp4(r: _Reader, file_size: int) -> Optional[ProbeResult]:
+    moov = next(((o, s) for t, o, s in _mp4_boxes(r, 0, file_size) if t == b"moov"), None)
+    if not moov:
+        return None
+
+    result = ProbeResult("mp4")
+
+    def walk(start: int, size: int, track: Dict[str, Any]):
+        for box_type, body, body_size in _mp4_boxes(r, start, start + size):
+            if box_type == b"trak":
+                child: Dict[str, Any] = {}
+                walk(body, body_size, child)
+                add_track(child)
+            elif box_type in MP4_CONTAINER_BOXES:
+                walk(body, body_size, track)
+            elif box_type == b"mvhd":
+                data = r.read_at(body, min(body_size, 32))
+                if data[:1] == b"\x01":
+                    timescale, duration = struct.unpack(">IQ", data[20:32])
+                else:
+                    timescale, duration = struct.unpack(">II", data[12:20])
+                if timescale:
+                    result.duration = round(duration / timescale, 3)
+            elif box_type == b"tkhd" and body_size >= 8:
+                data = r.read_at(body + body_size - 8, 8)
+                width, height = struct.unpack(">II", data)
+                track["width"], track["height"] = width >> 16, height >> 16
+            elif box_type == b"hdlr":
+                track["handler"] = r.read_at(body + 8, 4)
+            elif box_type == b"stsd":
+                data = r.read_at(body, 16)
+                if len(data) >= 16:
+                    track["codec"] = data[12:16].decode("ascii", "replace")
+
+    def add_track(track: Dict[str, Any]):
+        handler = track.get("handler")
+        codec = codec_name(track["codec"]) if track.get("codec") else None
+        if handler == b"vide":
+            result.video_streams += 1
+            if result.video_codec is None:
+                result.video_codec = codec
+                result.width = track.get("width") or None
+                result.height = track.get("height") or None
+        elif handler == b"soun":
+            result.audio_streams += 1
+            result.audio_codec = result.audio_codec or codec
+        elif handler in (b"sbtl", b"subt", b"text"):
+            result.subtitle_streams += 1
+
+    walk(moov[0], moov[1], {})
+    return result
+
+# --- AVI ---
+
+def _riff_chunks(data: bytes):
+    pos = 0
+    while pos + 8 <= len(data):
+        chunk_id, size = struct.unpack("<4sI", data[pos:pos + 8])
+        yield chunk_id, data[pos + 8:pos + 8 + size]
+        pos += 8 + size + (size & 1)
+
+def _probe_avi(r: _Reader, file_size: int) -> Optional[ProbeResult]:
+    header = r.read_at(12, 12)
+    if len(header) < 12 or header[:4] != b"LIST" or header[8:12] != b"hdrl":
+        return None
+    size = struct.unpack("<I", header[4:8])[0]
+    if size < 4:
+        return None  # truncated or corrupt hdrl chunk
+    hdrl = r.read_at(24, max(0, min(size - 4, MAX_ELEMENT_READ)))
+
+    result = ProbeResult("avi")
+    for chunk_id, body in _riff_chunks(hdrl):
+        if chunk_id == b"avih" and len(body) >= 40:
+            us_per_frame, = struct.unpack("<I", body[0:4])
+            total_frames, = struct.unpack("<I", body[16:20])
+            result.width, result.height = struct.unpack("<II", body[32:40])
+            result.duration = round(total_frames * us_per_frame / 1e6, 3) if us_per_frame else None
+        elif chunk_id == b"LIST" and body[:4] == b"strl":
+            strl = dict(_riff_chunks(body[4:]))
+            strh = strl.get(b"strh", b"")
+            stream_type, handler = strh[0:4], strh[4:8].decode("ascii", "replace").strip("\x00 ")
+            if stream_type == b"vids":
+                result.video_streams += 1
+                result.video_codec = result.video_codec or codec_name(handler.lower())
+            elif stream_type == b"auds":
+                result.audio_streams += 1
+                strf = strl.get(b"strf", b"")
+                if strf and result.audio_codec is None:
+                    format_tag, = struct.unpack("<H", strf[0:2])
+                    result.audio_codec = AVI_AUDIO_FORMATS.get(format_tag, f"0x{format_tag:04x}")
+            elif stream_type == b"txts":
+                result.subtitle_streams += 1
+    return result
+
+# --- Entry point ---
+
+_probe_cache: "OrderedDict[tuple, Optional[ProbeResult]]" = OrderedDict()
+_probe_lock = threading.Lock()
+
+def probe(path: str) -> Optional[ProbeResult]:
+    """Read duration, resolution, codecs and stream counts from MKV/MP4/MOV/AVI headers.
+
+    Results are cached by (device, inode, mtime, size), so repeat calls on an
+    unchanged file cost a single stat. Returns None for unsupported or unreadable files.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    with _probe_lock:
+        if key in _probe_cache:
+            _probe_cache.move_to_end(key)
+            return _probe_cache[key]
+
+    result = None
+    try:
+        with open(path, "rb") as f:
+            r = _Reader(f)
+            magic = r.read_at(0, 12)
+            if magic[:4] == struct.pack(">I", EBML_HEADER):
+                result = _probe_mkv(r, st.st_size)
+            elif magic[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+                result = _probe_mp4(r, st.st_size)
+            elif magic[:4] == b"RIFF" and magic[8:12] == b"AVI ":
+                result = _probe_avi(r, st.st_size)
+            if result:
+                result.bytes_read = r.bytes_read
+    except (OSError, struct.error, ValueError, IndexError):
+        result = None
+
+    with _probe_lock:
+        _probe_cache[key] = result
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return result
@@ -0,0 +1,477 @@
+import os
+import json
+import time
+import zlib
+import stat
+import errno
+import fcntl
+import shutil
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import xxhash
+
+from io_qos import IoPolicy
+
+# Fall back to the next copy primitive when the kernel refuses this one
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.EBADF, errno.ENOTSUP}
+
+# ioctl(dst_fd, FICLONE, src_fd): share the source's extents (btrfs, XFS reflink=1, bcachefs)
+FICLONE = 0x40049409
+# The filesystems can't clone between these files; copy instead
+REFLINK_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+
+COPY_CHUNK = 8 * 1024 * 1024
+CHECKPOINT_BYTES = 256 * 1024 * 1024
+PROGRESS_INTERVAL = 30.0
+
+class MoveInterrupted(Exception):
+    """A copy was paused for shutdown; calling move() again resumes it."""
+
+class ChecksumMismatch(IOError):
+    """Copied bytes didn't match an expected checksum; nothing was published and the source is untouched."""
+
+class Crc32:
+    """zlib.crc32 behind the update()/hexdigest() interface of the xxhash objects."""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+HASHERS = {"xxh64": xxhash.xxh64, "crc32": Crc32}
+
+class MoveResult:
+    """Outcome of a single move."""
+
+    __slots__ = ("source", "destination", "method", "size", "elapsed", "resumed_from", "hashes", "verified")
+
+    def __init__(self, source: str, destination: str, method: str, size: int = 0,
+                 elapsed: float = 0.0, resumed_from: int = 0, hashes: Optional[Dict[str, str]] = None,
+                 verified: bool = False):
+        self.source = source
+        self.destination = destination
+        self.method = method
+        self.size = size
+        self.elapsed = elapsed
+        self.resumed_from = resumed_from
+        self.hashes = hashes or {}  # algorithm -> hex digest of the bytes copied
+        self.verified = verified
+
+    def integrity(self) -> Optional[Dict[str, object]]:
+        """Sidecar record of what was copied, if the copy was hashed."""
+        if not {"xxh64", "crc32"} & self.hashes.keys():
+            return None
+        record = {"size": self.size, "verified": self.verified}
+        if "xxh64" in self.hashes:
+            record.update(algorithm="xxh64", hash=self.hashes["xxh64"])
+        if "crc32" in self.hashes:
+            record["crc32"] = self.hashes["crc32"]
+        return record
+
+    def __repr__(self) -> str:
+        return f"MoveResult({self.method}, {self.size} bytes, {self.elapsed:.2f}s, {self.destination!r})"
+
+def partial_path(destination: str) -> str:
+    """Hidden temp name in the destination directory used while a copy is in flight."""
+    directory, name = os.path.split(destination)
+    return os.path.join(directory, f".{name}.partial")
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def _discard(*paths: str):
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+
+class MoveEngine:
+    """Moves files by rename when possible, otherwise by a resumable kernel-side copy.
+
+    Cross-device copies go to a hidden .partial file next to the destination,
+    are preallocated, fsynced, and only then renamed into place, so a library
+    never shows a half-written file. Progress is checkpointed so an interrupted
+    copy resumes from the last fsynced offset. An IoPolicy, if given, paces copies
+    to each destination device under its bandwidth cap.
+
+    With hash_copies (or verify_copies, or an SFV expectation) the bytes are streamed
+    through user space and hashed on the way, which gives up the in-kernel copy;
+    verify_copies additionally re-reads the destination and compares.
+
+    before_copy(source), if set, is called before any bytes are copied (not for
+    renames, links or clones); it may raise to refuse the copy, leaving no partial.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, should_stop: Optional[Callable[[], bool]] = None,
+                 chunk_size: int = COPY_CHUNK, checkpoint_bytes: int = CHECKPOINT_BYTES,
+                 policy: Optional[IoPolicy] = None, hash_copies: bool = True, verify_copies: bool = False,
+                 verify_renames: bool = False, ensure_dir: Optional[Callable[[str], None]] = None,
+                 before_copy: Optional[Callable[[str], None]] = None):
+        self.logger = logger or logging.getLogger("move_engine")
+        self.should_stop = should_stop
+        self.chunk_size = chunk_size
+        self.checkpoint_bytes = checkpoint_bytes
+        self.policy = policy
+        self.hash_copies = hash_copies
+        self.verify_copies = verify_copies
+        self.verify_renames = verify_renames
+        self.ensure_dir = ensure_dir or (lambda path: os.makedirs(path, exist_ok=True))
+        self.before_copy = before_copy
+        self._reflink_lock = threading.Lock()
+        self._reflink: Dict[Tuple[int, int], bool] = {}  # (src dev, dst dev) -> clone supported
+
+    def _stopping(self) -> bool:
+        return callable(self.should_stop) and self.should_stop()
+
+    def move(self, source: str, destination: str, keep_source: bool = False,
+             expect: Optional[Dict[str, str]] = None) -> MoveResult:
+        """Move a file or directory tree to a destination that must not exist yet.
+
+        With keep_source the source stays where it is: same-device items are hardlinked,
+        cross-device items are cloned or copied. expect maps algorithm -> hex digest
+        (e.g. an SFV's crc32) that a file's bytes must match before it is published;
+        copies check it in their read pass, renames only when verify_renames is set.
+        """
+        if os.path.lexists(destination):
+            raise FileExistsError(errno.EEXIST, "Destination already exists", destination)
+
+        parent = os.path.dirname(destination) or "."
+        self.ensure_dir(parent)
+        try:
+            parent_dev = os.stat(parent).st_dev
+        except FileNotFoundError:
+            # ensure_dir trusted a stale directory listing
+            os.makedirs(parent, exist_ok=True)
+            parent_dev = os.stat(parent).st_dev
+        is_tree = os.path.isdir(source) and not os.path.islink(source)
+
+        if os.lstat(source).st_dev == parent_dev:
+            start = time.monotonic()
+            hashes = self._verify_in_place(source, expect) if expect and not is_tree else None
+            try:
+                if not keep_source:
+                    os.rename(source, destination)
+                    return MoveResult(source, destination, "rename", elapsed=time.monotonic() - start,
+                                      hashes=hashes, verified=bool(hashes))
+                if is_tree:
+                    self._link_tree(source, destination)
+                else:
+                    os.link(source, destination, follow_symlinks=False)
+                return MoveResult(source, destination, "hardlink", elapsed=time.monotonic() - start,
+                                  hashes=hashes, verified=bool(hashes))
+            except OSError as e:
+                # Bind mounts of one filesystem share st_dev but the kernel won't rename or link across them
+                if e.errno != errno.EXDEV:
+                    raise
+                self.logger.debug(f"Same device but {e.strerror} for {source} -> {destination}; copying instead")
+                if is_tree:
+                    shutil.rmtree(partial_path(destination), ignore_errors=True)
+
+        if is_tree:
+            return self._move_tree(source, destination, keep_source)
+        return self.move_file(source, destination, keep_source, expect)
+
+    def _link_tree(self, source: str, destination: str):
+        """Mirror a directory tree with hardlinks in a hidden temp dir, then rename it into place."""
+        temp_root = partial_path(destination)
+        for root, dirs, files in os.walk(source):
+            target_root = os.path.join(temp_root, os.path.relpath(root, source))
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                dst = os.path.join(target_root, name)
+                if not os.path.lexists(dst):
+                    os.link(os.path.join(root, name), dst, follow_symlinks=False)
+        os.rename(temp_root, destination)
+        _fsync_dir(os.path.dirname(destination) or ".")
+
+    def _move_tree(self, source: str, destination: str, keep_source: bool = False) -> MoveResult:
+        """Copy a directory tree file by file into a hidden temp dir, then rename it into place."""
+        start = time.monotonic()
+        if self.before_copy:
+            self.before_copy(source)
+        temp_root = partial_path(destination)
+        total = 0
+        for root, dirs, files in os.walk(source):
+            target_root = os.path.join(temp_root, os.path.relpath(root, source))
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                src = os.path.join(root, name)
+                dst = os.path.join(target_root, name)
+                if os.path.islink(src):
+                    if not os.path.lexists(dst):
+                        os.symlink(os.readlink(src), dst)
+                    if not keep_source:
+                        os.unlink(src)
+                else:
+                    total += self.move_file(src, dst, keep_source).size
+
+        os.rename(temp_root, destination)
+        _fsync_dir(os.path.dirname(destination) or ".")
+        if keep_source:
+            return MoveResult(source, destination, "tree-copy", total, time.monotonic() - start)
+
+        # Every file has been moved; remove the now-empty source tree bottom-up
+        for root, dirs, files in os.walk(source, topdown=False):
+            for name in dirs:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    os.unlink(path)
+                else:
+                    os.rmdir(path)
+        os.rmdir(source)
+        return MoveResult(source, destination, "tree-copy", total, time.monotonic() - start)
+
+    def move_file(self, source: str, destination: str, keep_source: bool = False,
+                  expect: Optional[Dict[str, str]] = None) -> MoveResult:
+        """Copy a file across devices into place atomically, then unlink the source (unless kept)."""
+        start = time.monotonic()
+        st = os.stat(source)
+        temp = partial_path(destination)
+        state_path = f"{temp}.json"
+        offset = self._resume_offset(source, st, temp, state_path)
+
+        algorithms = ({"xxh64"} if self.hash_copies or self.verify_copies else set()) | set(expect or ())
+        hashers = {name: HASHERS[name]() for name in algorithms if name in HASHERS}
+        verified = False
+        src_fd = os.open(source, os.O_RDONLY)
+        try:
+            flags = os.O_WRONLY | os.O_CREAT | (0 if offset else os.O_TRUNC)
+            dst_fd = os.open(temp, flags, 0o644)
+            try:
+                if not offset and st.st_size and self._clone(src_fd, dst_fd, st.st_dev):
+                    method, hashers = "reflink", {}  # no bytes pass through us to hash
+                else:
+                    if self.before_copy and st.st_size > offset:
+                        try:
+                            self.before_copy(source)
+                        except Exception:
+                            if not offset:
+                                _discard(temp)
+                            raise
+                    if not offset and st.st_size and hasattr(os, "posix_fallocate"):
+                        try:
+                            os.posix_fallocate(dst_fd, 0, st.st_size)
+                        except OSError:
+                            pass  # not supported by this filesystem; the copy still works
+                    if offset:
+                        self.logger.info(f"Resuming copy of {source} at {offset / 1e6:.1f} MB")
+                        if hashers:
+                            # Hash state isn't checkpointed; catch up over the already-copied prefix
+                            self._hash_range(src_fd, 0, offset, hashers.values())
+                    method = self._copy(src_fd, dst_fd, offset, st.st_size, source, st, state_path, hashers)
+                os.ftruncate(dst_fd, st.st_size)
+                self._copy_stat(dst_fd, st, temp)
+                os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+
+        hashes = {name: h.hexdigest() for name, h in hashers.items()}
+        if method == "reflink" and expect:
+            hashes = self._verify_in_place(source, expect) or {}
+        if expect:
+            try:
+                self._check_expected(source, expect, hashes)
+            except ChecksumMismatch:
+                _discard(temp, state_path)
+                raise
+            verified = any(name in hashes for name in expect)
+        if "xxh64" in hashes and self.verify_copies:
+            self._verify(temp, st.st_size, hashes["xxh64"], state_path)
+            verified = True
+
+        if os.path.lexists(destination):
+            raise FileExistsError(errno.EEXIST, "Destination appeared during copy", destination)
+        os.rename(temp, destination)
+        _fsync_dir(os.path.dirname(destination) or ".")
+        if not keep_source:
+            os.unlink(source)
+        if os.path.exists(state_path):
+            os.unlink(state_path)
+
+        elapsed = time.monotonic() - start
+        copied = st.st_size - offset
+        rate = copied / elapsed / 1e6 if elapsed > 0 else 0.0
+        self.logger.info(f"Copied {os.path.basename(source)}: {copied / 1e6:.1f} MB via {method} in {elapsed:.2f}s ({rate:.1f} MB/s)")
+        return MoveResult(source, destination, method, st.st_size, elapsed, offset, hashes, verified)
+
+    def _copy_stat(self, dst_fd: int, st: os.stat_result, temp: str):
+        """Carry over permission bits and times like copy2 (Plex uses mtime as the date added)."""
+        try:
+            os.fchmod(dst_fd, stat.S_IMODE(st.st_mode))
+            os.utime(dst_fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except OSError as e:
+            self.logger.debug(f"Could not copy mode/times to {temp}: {str(e)}")
+
+    def _hash_range(self, fd: int, start: int, end: int, hashers):
+        offset = start
+        while offset < end:
+            data = os.pread(fd, min(self.chunk_size, end - offset), offset)
+            if not data:
+                raise IOError(errno.EIO, "File shrank while hashing")
+            for hasher in hashers:
+                hasher.update(data)
+            offset += len(data)
+
+    def _verify_in_place(self, source: str, expect: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """For moves that read no bytes: check expected digests with one read, if configured to."""
+        if not self.verify_renames:
+            return None
+        hashers = {name: HASHERS[name]() for name in expect if name in HASHERS}
+        fd = os.open(source, os.O_RDONLY)
+        try:
+            self._hash_range(fd, 0, os.fstat(fd).st_size, hashers.values())
+        finally:
+            os.close(fd)
+        hashes = {name: h.hexdigest() for name, h in hashers.items()}
+        self._check_expected(source, expect, hashes)
+        return hashes
+
+    def _check_expected(self, source: str, expect: Dict[str, str], hashes: Dict[str, str]):
+        for name, wanted in expect.items():
+            actual = hashes.get(name)
+            if actual is not None and actual.lower() != wanted.lower():
+                raise ChecksumMismatch(errno.EIO, f"{name} mismatch for {source}: got {actual}, expected {wanted.lower()}")
+
+    def _verify(self, temp: str, size: int, expected: str, state_path: str):
+        """Re-read the written copy; on mismatch drop it so the next attempt starts clean."""
+        check = xxhash.xxh64()
+        fd = os.open(temp, os.O_RDONLY)
+        try:
+            self._hash_range(fd, 0, size, (check,))
+        finally:
+            os.close(fd)
+        if check.hexdigest() != expected:
+            _discard(temp, state_path)
+            raise IOError(errno.EIO, f"Verification failed for {temp}: {check.hexdigest()} != {expected}")
+        self.logger.debug(f"Verified {temp} ({expected})")
+
+    def may_clone(self, src_dev: int, dst_dev: int) -> bool:
+        """False once a device pair has refused a clone; pairs not tried yet are worth a try."""
+        with self._reflink_lock:
+            return self._reflink.get((src_dev, dst_dev)) is not False
+
+    def _clone(self, src_fd: int, dst_fd: int, src_dev: int) -> bool:
+        """Try a constant-time reflink clone; remembers per device pair when it can't work."""
+        key = (src_dev, os.fstat(dst_fd).st_dev)
+        with self._reflink_lock:
+            supported = self._reflink.get(key)
+        if supported is False:
+            return False
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        except OSError as e:
+            if e.errno not in REFLINK_UNSUPPORTED_ERRNOS:
+                raise
+            # A pair that has cloned before may still refuse a single file (e.g. nodatacow), so only
+            # a refusal on first contact marks the pair unsupported
+            if supported is None:
+                with self._reflink_lock:
+                    self._reflink[key] = False
+                self.logger.debug(f"Reflink not available between devices {key[0]} and {key[1]} ({e.strerror}); copying")
+            return False
+        if supported is None:
+            with self._reflink_lock:
+                self._reflink[key] = True
+            self.logger.info(f"Reflink clones enabled between devices {key[0]} and {key[1]}")
+        return True
+
+    def _resume_offset(self, source: str, st: os.stat_result, temp: str, state_path: str) -> int:
+        """Offset of the last checkpoint for this exact source, or 0 to start over."""
+        if not os.path.exists(temp) or not os.path.exists(state_path):
+            return 0
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if state.get("source") != source or state.get("size") != st.st_size or state.get("mtime_ns") != st.st_mtime_ns:
+            self.logger.info(f"Discarding stale partial copy for {source}")
+            return 0
+        return min(int(state.get("offset", 0)), st.st_size)
+
+    def _checkpoint(self, dst_fd: int, source: str, st: os.stat_result, state_path: str, offset: int):
+        os.fsync(dst_fd)
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": source, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "offset": offset}, f)
+        os.replace(tmp_path, state_path)
+
+    def _copy(self, src_fd: int, dst_fd: int, offset: int, size: int, source: str,
+              st: os.stat_result, state_path: str, hashers: Optional[Dict[str, object]] = None) -> str:
+        """Copy [offset, size) with the fastest primitive the kernel accepts; returns its name.
+
+        Hashers need the bytes in user space, so they force pread/pwrite streaming.
+        """
+        hashers = list((hashers or {}).values())
+        methods = []
+        if not hashers and hasattr(os, "copy_file_range"):
+            methods.append("copy_file_range")
+        if not hashers and hasattr(os, "sendfile"):
+            methods.append("sendfile")
+        methods.append("readwrite")
+
+        last_checkpoint = offset
+        method_index = 0
+        dst_dev = os.fstat(dst_fd).st_dev
+        started, start_offset = time.monotonic(), offset
+        last_progress = started
+        while offset < size:
+            if self._stopping():
+                self._checkpoint(dst_fd, source, st, state_path, offset)
+                raise MoveInterrupted(f"Copy of {source} paused at {offset} of {size} bytes")
+
+            count = min(self.chunk_size, size - offset)
+            method = methods[method_index]
+            try:
+                if method == "copy_file_range":
+                    written = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+                elif method == "sendfile":
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    written = os.sendfile(dst_fd, src_fd, offset, count)
+                else:
+                    data = os.pread(src_fd, count, offset)
+                    for hasher in hashers:
+                        hasher.update(data)
+                    view, written = memoryview(data), 0
+                    while written < len(data):
+                        written += os.pwrite(dst_fd, view[written:], offset + written)
+            except OSError as e:
+                if e.errno in FALLBACK_ERRNOS and method_index + 1 < len(methods):
+                    method_index += 1
+                    continue
+                raise
+
+            if written == 0:
+                raise IOError(errno.EIO, f"Source shrank during copy: {source}")
+            offset += written
+            if self.policy:
+                self.policy.throttle(dst_dev, written)
+
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                rate = (offset - start_offset) / (now - started) / 1e6
+                self.logger.info(
+                    f"Copying {os.path.basename(source)}: {offset / 1e6:.0f}/{size / 1e6:.0f} MB "
+                    f"({offset * 100 // size}%) at {rate:.1f} MB/s"
+                )
+                last_progress = now
+
+            if offset - last_checkpoint >= self.checkpoint_bytes:
+                self._checkpoint(dst_fd, source, st, state_path, offset)
+                last_checkpoint = offset
+
+        return methods[method_index]
@@ -0,0 +1,424 @@
+import os
+import time
+import errno
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from io_qos import IoPolicy
+from library_placement import free_bytes
+
+FAST_LANE_WORKERS = 2
+DEFER_POLL_SECONDS = 60
+SPACE_POLL_SECONDS = 60
+SPACE_WAIT_SECONDS = 6 * 3600
+
+def nearest_existing(path: str) -> str:
+    """path itself, or its nearest ancestor that exists (for destinations not created yet)."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+def device_of(path: str) -> int:
+    """st_dev of a path, or of its nearest existing ancestor for paths not created yet."""
+    return os.stat(nearest_existing(path)).st_dev
+
+def tree_size(path: str) -> int:
+    """Total bytes of a file, or of every file under a directory."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+class NeedsCopy(Exception):
+    """A fast-lane job found it has to copy bytes; it is re-queued as a copy before it moves anything."""
+
+class MoveScheduler:
+    """Runs move jobs on per-(source device, destination device) lanes.
+
+    Same-device moves are renames and go to a shared fast lane, so they never wait
+    behind a long copy. Cross-device jobs queue on their device pair's lane, which
+    runs `concurrency` jobs at a time (1 = strictly sequential per spindle pair);
+    different device pairs proceed in parallel. With an IoPolicy, copies above its
+    size threshold are held until the off-peak window opens. Pairs that may_clone()
+    doesn't rule out also start on the fast lane: a reflink clone is constant time,
+    so no size, deferral or admission check is made up front.
+
+    Copies are admitted only if they fit: the destination's free space, less what
+    already-admitted copies to that device have reserved and a `min_free` margin.
+    A reservation lasts until its job ends, so a running copy's preallocated blocks
+    count twice and admission errs towards waiting. A copy that doesn't fit is
+    offered to its job's reroute callback (e.g. another library root), else waits
+    for space to come back, whether from copies finishing or from outside; one
+    that can never fit, or still doesn't after SPACE_WAIT_SECONDS, fails with ENOSPC.
+
+    A fast-lane job can still need a copy: the clone is refused (e.g. a nodatacow
+    file), or a same-device rename fails with EXDEV (bind mounts of one filesystem
+    share st_dev). The engine calls before_copy() before copying bytes; on the
+    fast lane that raises NeedsCopy and the job is queued again on its device
+    pair's lane, through deferral and admission, unless it has already moved
+    something (see committed()). Directory trees are never cloned as a whole, so
+    a tree bounces to its device lane before any file is moved.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, concurrency: int = 1,
+                 should_stop: Optional[Callable[[], bool]] = None, policy: Optional[IoPolicy] = None,
+                 min_free: int = 0, may_clone: Optional[Callable[[int, int], bool]] = None):
+        self.logger = logger or logging.getLogger("move_scheduler")
+        self.concurrency = max(1, concurrency)
+        self.should_stop = should_stop
+        self.policy = policy
+        self.min_free = min_free
+        self.may_clone = may_clone
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._deferred: List[Tuple[str, str, Callable[[], Any], Future]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._reserved: Dict[int, int] = {}  # destination device -> bytes promised to admitted copies
+        self._waiting: List[Tuple[str, str, Callable[[], Any], Future, int, float]] = []
+        self._reroutes: Dict[str, Callable[[], Optional[Tuple[str, Callable[[], Any]]]]] = {}
+        self._space_watcher: Optional[threading.Thread] = None
+        self._space_changed = threading.Event()
+        self._fast_lane = ThreadPoolExecutor(max_workers=FAST_LANE_WORKERS, thread_name_prefix="move-fast")
+        self._lanes: Dict[Tuple[int, int], ThreadPoolExecutor] = {}
+        self._queued: Dict[str, int] = {}
+        self._in_flight: Dict[str, str] = {}  # source path -> lane name
+        self._local = threading.local()
+
+    def _lane_for(self, source: str, destination: str) -> Tuple[str, ThreadPoolExecutor]:
+        src_dev, dst_dev = device_of(source), device_of(os.path.dirname(destination))
+        if src_dev == dst_dev:
+            return "rename", self._fast_lane
+        if self.may_clone and self.may_clone(src_dev, dst_dev):
+            return "reflink", self._fast_lane
+        return self._copy_lane(source, destination)
+
+    def _copy_lane(self, source: str, destination: str) -> Tuple[str, ThreadPoolExecutor]:
+        src_dev, dst_dev = device_of(source), device_of(os.path.dirname(destination))
+        key = (src_dev, dst_dev)
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"move-{src_dev}-{dst_dev}")
+                self._lanes[key] = lane
+        return f"{src_dev}->{dst_dev}", lane
+
+    def submit(self, source: str, destination: str, work: Callable[[], Any],
+               reroute: Optional[Callable[[], Optional[Tuple[str, Callable[[], Any]]]]] = None) -> Future:
+        """Queue work that moves source to destination on the lane for their devices.
+
+        reroute, if given, returns another (destination, work) for the job to try
+        when its destination has no room for the copy.
+        """
+        name, lane = self._lane_for(source, destination)
+        source = os.path.normpath(source)
+        if reroute:
+            with self._lock:
+                self._reroutes[source] = reroute
+        try:
+            if lane is self._fast_lane:
+                future = self._enqueue(source, destination, name, lane, work)
+            else:
+                future = self._submit_copy(source, destination, work)
+        except Exception:
+            self._forget_reroute(source)
+            raise
+        if reroute:
+            future.add_done_callback(lambda f: self._forget_reroute(source))
+        return future
+
+    def _forget_reroute(self, source: str):
+        with self._lock:
+            self._reroutes.pop(source, None)
+
+    def before_copy(self, source: str):
+        """MoveEngine hook: send a fast-lane job that is about to copy bytes back to be queued as a copy."""
+        if getattr(self._local, "bounce", False):
+            raise NeedsCopy(f"Move of {source} needs a copy")
+
+    def committed(self):
+        """Called once a job has moved something; from then on it finishes on the lane it runs on."""
+        self._local.bounce = False
+
+    def _submit_copy(self, source: str, destination: str, work: Callable[[], Any]) -> Future:
+        size = tree_size(source)
+        if self.policy and self.policy.defer_above and self.policy.should_defer(size):
+            return self._defer(source, destination, work, size)
+        return self._admit(source, destination, work, size)
+
+    def reserved(self, device: int) -> int:
+        """Bytes promised to admitted copies that have not finished on this device."""
+        with self._lock:
+            return self._reserved.get(device, 0)
+
+    def _reserve(self, destination: str, size: int) -> Tuple[int, bool]:
+        """Reserve size bytes on destination's device if they fit; returns (device, reserved)."""
+        target = nearest_existing(os.path.dirname(destination))
+        free, device = free_bytes(target), device_of(target)
+        with self._lock:
+            if free >= 0 and free - self._reserved.get(device, 0) - self.min_free < size:
+                return device, False
+            self._reserved[device] = self._reserved.get(device, 0) + size
+        return device, True
+
+    def _unreserve(self, device: int, size: int):
+        with self._lock:
+            self._reserved[device] -= size
+            if not self._reserved[device]:
+                del self._reserved[device]
+        self._space_changed.set()
+
+    def _capacity(self, destination: str) -> int:
+        """Most bytes a copy to destination's device could ever be admitted with (-1 if unknown)."""
+        try:
+            st = os.statvfs(nearest_existing(os.path.dirname(destination)))
+        except OSError:
+            return -1
+        return st.f_blocks * st.f_frsize - self.min_free
+
+    def _reroute(self, source: str, destination: str, work: Callable[[], Any], size: int,
+                 device: int) -> Tuple[str, Callable[[], Any], int, bool]:
+        """Try the job's reroute callback after admission failed; returns (destination, work, device, reserved)."""
+        with self._lock:
+            reroute = self._reroutes.get(source)
+        if not reroute:
+            return destination, work, device, False
+        try:
+            alternative = reroute()
+        except Exception as e:
+            self.logger.warning(f"Could not re-route copy of {source}: {str(e)}")
+            return destination, work, device, False
+        if not alternative or alternative[0] == destination:
+            return destination, work, device, False
+        new_destination, new_work = alternative
+        new_device, reserved = self._reserve(new_destination, size)
+        if not reserved:
+            return destination, work, device, False
+        self.logger.info(
+            f"No room for {source} in {os.path.dirname(destination)} — re-routed to {os.path.dirname(new_destination)}"
+        )
+        return new_destination, new_work, new_device, True
+
+    def _no_space(self, source: str, destination: str, size: int, reason: str) -> OSError:
+        error = OSError(
+            errno.ENOSPC,
+            f"No room for {size / 1e9:.1f} GB copy of {source} in {os.path.dirname(destination)} ({reason})"
+        )
+        self.logger.error(str(error))
+        return error
+
+    def _admit(self, source: str, destination: str, work: Callable[[], Any], size: int) -> Future:
+        """Enqueue a copy once its destination (or one its job re-routes to) has room for it.
+
+        A copy that doesn't fit waits in _waiting, polled every SPACE_POLL_SECONDS;
+        after SPACE_WAIT_SECONDS it fails with ENOSPC (and the scanner parks the
+        item) rather than blocking it for good. One larger than the disk fails at once.
+        """
+        device, reserved = self._reserve(destination, size)
+        if not reserved:
+            destination, work, device, reserved = self._reroute(source, destination, work, size, device)
+        if reserved:
+            name, lane = self._copy_lane(source, destination)
+            return self._enqueue(source, destination, name, lane, work, (device, size))
+
+        future: Future = Future()
+        capacity = self._capacity(destination)
+        if 0 <= capacity < size:
+            future.set_exception(self._no_space(source, destination, size, "larger than the disk"))
+            return future
+        with self._lock:
+            self._in_flight[source] = "waiting-space"
+            self._waiting.append((source, destination, work, future, size, time.monotonic()))
+            if self._space_watcher is None:
+                self._space_watcher = threading.Thread(target=self._watch_space, name="move-space", daemon=True)
+                self._space_watcher.start()
+        self.logger.warning(
+            f"Not enough free space for {size / 1e9:.1f} GB copy of {source} to {os.path.dirname(destination)} "
+            f"— waiting up to {SPACE_WAIT_SECONDS / 3600:.0f} h for space"
+        )
+        return future
+
+    def _watch_space(self):
+        """Admit waiting copies as jobs finish (releasing reservations) or space is freed.
+
+        Entries stay in _waiting until claimed under the lock, so close() can
+        still cancel any of them.
+        """
+        while not self._closing.is_set():
+            self._space_changed.wait(SPACE_POLL_SECONDS)
+            self._space_changed.clear()
+            with self._lock:
+                waiting = list(self._waiting)
+            for entry in waiting:
+                source, destination, work, future, size, since = entry
+                if self._closing.is_set():
+                    return
+                error = None
+                try:
+                    device, reserved = self._reserve(destination, size)
+                    if not reserved:
+                        destination, work, device, reserved = self._reroute(source, destination, work, size, device)
+                except OSError as e:
+                    device, reserved, error = None, False, e
+                if not reserved and error is None:
+                    if time.monotonic() - since < SPACE_WAIT_SECONDS:
+                        continue
+                    error = self._no_space(source, destination, size, "gave up waiting for space")
+
+                with self._lock:
+                    claimed = not self._closing.is_set() and entry in self._waiting
+                    if claimed:
+                        self._waiting.remove(entry)
+                        if error:
+                            self._in_flight.pop(source, None)
+                if not claimed or not future.set_running_or_notify_cancel():
+                    if reserved:
+                        self._unreserve(device, size)
+                    continue
+                if error:
+                    future.set_exception(error)
+                    continue
+
+                self.logger.info(f"Space available — starting {size / 1e9:.1f} GB copy of {source}")
+                try:
+                    name, lane = self._copy_lane(source, destination)
+                    inner = self._enqueue(source, destination, name, lane, work, (device, size))
+                except Exception as e:
+                    self._unreserve(device, size)
+                    _fail(future, e, self._closing.is_set())
+                    continue
+                inner.add_done_callback(lambda f, outer=future: _chain(f, outer))
+
+    def _defer(self, source: str, destination: str, work: Callable[[], Any], size: int) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._in_flight[source] = "deferred"
+            self._deferred.append((source, destination, work, future))
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_offpeak, name="move-offpeak", daemon=True)
+                self._watcher.start()
+        self.logger.info(f"Deferring {size / 1e9:.1f} GB copy of {source} until the off-peak window")
+        return future
+
+    def _watch_offpeak(self):
+        """Release deferred copies onto their lanes once the off-peak window opens."""
+        while not self._closing.wait(DEFER_POLL_SECONDS):
+            if not self.policy.in_offpeak():
+                continue
+            with self._lock:
+                released, self._deferred = self._deferred, []
+                for source, _, _, _ in released:
+                    self._in_flight.pop(source, None)
+            if released:
+                self.logger.info(f"Off-peak window open — starting {len(released)} deferred copy job(s)")
+            for source, destination, work, future in released:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    inner = self._admit(source, destination, work, tree_size(source))
+                except Exception as e:
+                    _fail(future, e, self._closing.is_set())
+                    continue
+                inner.add_done_callback(lambda f, outer=future: _chain(f, outer))
+
+    def _enqueue(self, source: str, destination: str, name: str, lane: ThreadPoolExecutor,
+                 work: Callable[[], Any], reservation: Optional[Tuple[int, int]] = None) -> Future:
+        with self._lock:
+            self._in_flight[source] = name
+            self._queued[name] = self._queued.get(name, 0) + 1
+        self.logger.debug(f"Queued move on lane {name}: {source}")
+
+        def run():
+            self._local.bounce = lane is self._fast_lane
+            try:
+                if callable(self.should_stop) and self.should_stop():
+                    self.logger.info(f"Shutdown requested — not starting move of {source}")
+                    return None
+                return work()
+            except NeedsCopy as e:
+                self.logger.info(f"{str(e)} — queueing it on its device lane")
+                return self._submit_copy(source, destination, work)
+            finally:
+                self._local.bounce = False
+                with self._lock:
+                    # A re-queued job is already in flight under its new lane
+                    if self._in_flight.get(source) == name:
+                        del self._in_flight[source]
+                    self._queued[name] -= 1
+                if reservation:
+                    self._unreserve(*reservation)
+
+        future: Future = Future()
+        lane.submit(run).add_done_callback(lambda f: _chain(f, future))
+        future.add_done_callback(lambda f: self._log_failure(f, source))
+        return future
+
+    def _log_failure(self, future: Future, source: str):
+        if not future.cancelled() and future.exception():
+            self.logger.error(f"Move job failed for {source}: {future.exception()}")
+
+    def is_busy(self, path: str) -> bool:
+        """True while a job for this source path is queued or running."""
+        with self._lock:
+            return os.path.normpath(path) in self._in_flight
+
+    def status(self) -> Dict[str, int]:
+        """Jobs queued or running per lane, plus copies waiting for off-peak or for free space."""
+        with self._lock:
+            status = {name: count for name, count in self._queued.items() if count}
+            if self._deferred:
+                status["deferred"] = len(self._deferred)
+            if self._waiting:
+                status["waiting_space"] = len(self._waiting)
+                status["waiting_space_bytes"] = sum(entry[4] for entry in self._waiting)
+            return status
+
+    def close(self, wait: bool = True):
+        """Stop accepting work and wait for queued jobs (which skip themselves on shutdown)."""
+        self._closing.set()
+        self._space_changed.set()
+        with self._lock:
+            deferred, self._deferred = self._deferred, []
+            waiting, self._waiting = self._waiting, []
+            for source, _, _, future, *_ in deferred + waiting:
+                self._in_flight.pop(source, None)
+                future.cancel()
+        # Sources stay in uploads, so the next run picks them up again
+        if deferred:
+            self.logger.info(f"{len(deferred)} deferred copy job(s) left for the next off-peak window")
+        if waiting:
+            self.logger.info(f"{len(waiting)} copy job(s) still waiting for free space left for the next run")
+        self._fast_lane.shutdown(wait=wait)
+        with self._lock:
+            lanes = list(self._lanes.values())
+        for lane in lanes:
+            lane.shutdown(wait=wait)
+
+def _fail(future: Future, error: Exception, closing: bool):
+    # Lanes refuse work once shutdown starts; that job just waits for the next run
+    if closing:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+def _chain(inner: Future, outer: Future):
+    if inner.cancelled():
+        outer.set_result(None)
+    elif inner.exception():
+        outer.set_exception(inner.exception())
+    elif isinstance(inner.result(), Future):
+        # The job was re-queued as a copy; outer completes with that
+        inner.result().add_done_callback(lambda f: _chain(f, outer))
+    else:
+        outer.set_result(inner.result())
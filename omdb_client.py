@@ -1,14 +1,30 @@
 import time
+import threading
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
 from functools import lru_cache
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import logging
-import difflib
+
+# Requests observed before the hedge threshold is derived from history
+HEDGE_WARMUP_SAMPLES = 20
+LATENCY_REPORT_EVERY = 50
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile of a sample collection (0.0 when empty)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
 
 class OMDbClient:
     """Handles OMDb API querying with caching and logging."""
 
-    def __init__(self, api_key: str, api_url: str, timeout: int = 10, logger: Optional[logging.Logger] = None):
+    def __init__(self, api_key: str, api_url: str, timeout: int = 10, logger: Optional[logging.Logger] = None,
+                 hedge_percentile: float = 95.0, hedge_min_delay: float = 0.5,
+                 secondary_url: Optional[str] = None, secondary_key: Optional[str] = None):
         self.api_key = api_key
         self.api_url = api_url
         self.timeout = timeout
@@ -16,25 +32,116 @@ class OMDbClient:
         self.last_reset = time.time()
         self.logger = logger or logging.getLogger("omdb_client")
 
+        # Hedging: duplicate slow requests to the secondary provider (off without one:
+        # a second request to the same rate-limited API only adds load)
+        self.providers: List[Tuple[str, str]] = [(api_url, api_key)]
+        if secondary_url:
+            self.providers.append((secondary_url, secondary_key or api_key))
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedged_count = 0
+        self.response_latencies = deque(maxlen=500)
+        self.lookup_latencies = deque(maxlen=1000)
+        self.lookup_count = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="omdb")
+
     def reset_if_needed(self):
         if time.time() - self.last_reset > 86400:
             self.api_call_count = 0
             self.last_reset = time.time()
 
-    @lru_cache(maxsize=500)
-    def query(self, title: str, year: Optional[str] = None, media_type: str = "movie") -> Optional[Dict[str, Any]]:
-        """Query OMDb and return JSON metadata or None."""
+    def _within_limit(self) -> bool:
         self.reset_if_needed()
-
         if self.api_call_count >= 1000:
             self.logger.error("OMDb API rate limit reached (1000 calls/day)")
+            return False
+        return True
+
+    def _fetch(self, provider: Tuple[str, str], params: Dict[str, str]) -> Dict[str, Any]:
+        """Issue one HTTP request against a provider and return the decoded JSON body."""
+        url, key = provider
+        start_time = time.monotonic()
+        response = requests.get(url, params=dict(params, apikey=key, r="json"), timeout=self.timeout)
+        with self._lock:
+            self.api_call_count += 1
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            raise requests.RequestException(f"Unexpected OMDb payload from {url}")
+        with self._lock:
+            self.response_latencies.append(time.monotonic() - start_time)
+        return data
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait on the primary before hedging, or None when hedging is off."""
+        if self.hedge_percentile <= 0 or len(self.providers) < 2:
+            return None
+        with self._lock:
+            samples = list(self.response_latencies)
+        if len(samples) < HEDGE_WARMUP_SAMPLES:
+            return max(self.hedge_min_delay, self.timeout / 2)
+        return max(self.hedge_min_delay, percentile(samples, self.hedge_percentile))
+
+    def _request(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """Issue an OMDb request, hedging to a second request if the first is slow."""
+        start_time = time.monotonic()
+        futures = [self._executor.submit(self._fetch, self.providers[0], params)]
+
+        delay = self.hedge_delay()
+        if delay is not None:
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                backup = self.providers[1]
+                self.logger.debug(f"OMDb request exceeded {delay:.2f}s — hedging to {backup[0]}")
+                self.hedged_count += 1
+                futures.append(self._executor.submit(self._fetch, backup, params))
+
+        error = None
+        for future in as_completed(futures):
+            try:
+                data = future.result()
+            except (requests.RequestException, ValueError) as e:
+                error = e
+                continue
+            self._record_lookup(time.monotonic() - start_time)
+            return data
+
+        self._record_lookup(time.monotonic() - start_time)
+        if isinstance(error, requests.RequestException):
+            raise error
+        raise requests.RequestException(str(error))
+
+    def _record_lookup(self, elapsed: float):
+        self.lookup_latencies.append(elapsed)
+        self.lookup_count += 1  # the deque stops growing at maxlen, so count separately
+        if self.lookup_count % LATENCY_REPORT_EVERY == 0:
+            report = self.latency_report()
+            self.logger.info(
+                f"OMDb latency p50={report['p50']:.2f}s p95={report['p95']:.2f}s "
+                f"p99={report['p99']:.2f}s over {report['samples']} lookups ({report['hedged']} hedged)"
+            )
+
+    def latency_report(self) -> Dict[str, float]:
+        """Caller-visible lookup latency percentiles and hedge count."""
+        samples = list(self.lookup_latencies)
+        return {
+            "samples": len(samples),
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            "hedged": self.hedged_count
+        }
+
+    @lru_cache(maxsize=500)
+    def query(self, title: str, year: Optional[str] = None, media_type: str = "movie") -> Optional[Dict[str, Any]]:
+        """Query OMDb and return JSON metadata or None."""
+        if not self._within_limit():
             return None
 
         params = {
-            "apikey": self.api_key,
             "t": title,
-            "type": media_type,
-            "r": "json"
+            "type": media_type
         }
 
         if year:
@@ -44,12 +151,8 @@ class OMDbClient:
             self.logger.info(f"Searching OMDb: '{title}' ({year}) [{media_type}]")
             start_time = time.time()
 
-            response = requests.get(self.api_url, params=params, timeout=self.timeout)
-            response.raise_for_status()
-
-            self.api_call_count += 1
+            data = self._request(params)
             elapsed = time.time() - start_time
-            data = response.json()
 
             if data.get("Response") == "True":
                 self.logger.info(f"OMDb match: {data.get('Title')} ({data.get('Year')}) [in {elapsed:.2f}s]")
@@ -62,46 +165,42 @@ class OMDbClient:
             self.logger.warning(f"OMDb request failed: {str(e)}")
             return None
 
-    def fuzzy_search(self, title: str, year: Optional[str] = None, media_type: str = "movie", threshold: float = 0.8) -> Optional[Dict[str, str]]:
-
-        """Fallback fuzzy title search using OMDb's 's' parameter (limited results)."""
-        self.reset_if_needed()
-
-        if self.api_call_count >= 1000:
-            self.logger.error("OMDb API rate limit reached (1000 calls/day)")
+    @lru_cache(maxsize=500)
+    def query_by_id(self, imdb_id: str) -> Optional[Dict[str, Any]]:
+        """Exact OMDb lookup by IMDb id ('i' parameter)."""
+        if not self._within_limit():
             return None
 
-        params = {
-            "apikey": self.api_key,
-            "s": title,
-            "type": media_type,
-            "r": "json"
-        }
-
         try:
-            self.logger.debug(f"Fuzzy searching OMDb: '{title}' [{media_type}]")
-            response = requests.get(self.api_url, params=params, timeout=self.timeout)
-            response.raise_for_status()
-            self.api_call_count += 1
-
-            search_data = response.json()
-            if search_data.get("Response") != "True":
-                self.logger.warning(f"No fuzzy OMDb results for: {title}")
-                return None
-
-            titles = search_data.get("Search", [])
-            best_match = difflib.get_close_matches(title, [item["Title"] for item in titles], n=1, cutoff=0.6)
-
-            if best_match:
-                for item in titles:
-                    if item["Title"] == best_match[0]:
-                        return self.query(item["Title"], item.get("Year"), media_type=media_type)
-            else:
-                self.logger.warning(f"No close fuzzy match found for '{title}'")
+            self.logger.info(f"Looking up OMDb id: {imdb_id}")
+            data = self._request({"i": imdb_id})
+            if data.get("Response") == "True":
+                self.logger.info(f"OMDb match: {data.get('Title')} ({data.get('Year')}) [{imdb_id}]")
+                return data
 
+            self.logger.info(f"No OMDb match: {data.get('Error', 'Unknown error')} for '{imdb_id}'")
             return None
 
         except requests.RequestException as e:
-            self.logger.warning(f"Fuzzy OMDb request failed: {str(e)}")
+            self.logger.warning(f"OMDb request failed: {str(e)}")
             return None
 
+    def search(self, title: str, media_type: Optional[str] = None) -> List[Dict[str, str]]:
+        """Return OMDb 's' search results, optionally restricted to a type."""
+        if not self._within_limit():
+            return []
+
+        params = {"s": title}
+        if media_type:
+            params["type"] = media_type
+
+        try:
+            self.logger.debug(f"Searching OMDb listings: '{title}' [{media_type or 'any'}]")
+            data = self._request(params)
+            if data.get("Response") != "True":
+                return []
+            return data.get("Search", [])
+
+        except requests.RequestException as e:
+            self.logger.warning(f"OMDb search failed: {str(e)}")
+            return []
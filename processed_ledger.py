@@ -0,0 +1,74 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+class ProcessedLedger:
+    """Uploads already ingested in link mode, so sources left in place aren't picked up again.
+
+    Entries are keyed by source path and remember the (device, inode) they were
+    recorded with; a file replaced under the same name counts as new.
+    """
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger("processed_ledger")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            "source TEXT PRIMARY KEY, dev INTEGER NOT NULL, ino INTEGER NOT NULL, "
+            "destination TEXT, method TEXT, processed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._entries: Dict[str, Tuple[int, int]] = {
+            source: (dev, ino) for source, dev, ino in self._db.execute("SELECT source, dev, ino FROM processed")
+        }
+        self.prune()
+
+    def is_processed(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        with self._lock:
+            identity = self._entries.get(path)
+        if identity is None:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return identity == (st.st_dev, st.st_ino)
+
+    def record(self, source: str, destination: Optional[str] = None, method: str = ""):
+        source = os.path.normpath(source)
+        try:
+            st = os.stat(source)
+        except OSError as e:
+            self.logger.warning(f"Cannot record {source} in ledger: {str(e)}")
+            return
+        with self._lock:
+            self._entries[source] = (st.st_dev, st.st_ino)
+            self._db.execute(
+                "INSERT OR REPLACE INTO processed (source, dev, ino, destination, method, processed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (source, st.st_dev, st.st_ino, destination, method, time.time())
+            )
+            self._db.commit()
+
+    def prune(self):
+        """Forget sources that no longer exist (e.g. torrents removed from the client)."""
+        with self._lock:
+            gone = [source for source in self._entries if not os.path.lexists(source)]
+            for source in gone:
+                del self._entries[source]
+            if gone:
+                self._db.executemany("DELETE FROM processed WHERE source = ?", [(s,) for s in gone])
+                self._db.commit()
+        if gone:
+            self.logger.debug(f"Pruned {len(gone)} removed source(s) from the processed ledger")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
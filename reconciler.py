@@ -0,0 +1,120 @@
+import os
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ingest_manifest import VIDEO_EXTS, AUDIO_EXTS, SUBTITLE_EXTS
+from library_catalog import LibraryCatalog
+
+TRACKED_EXTS = VIDEO_EXTS + AUDIO_EXTS + SUBTITLE_EXTS
+
+class Reconciler:
+    """Brings the catalog back in line with the library after changes made outside media-mover.
+
+    A directory's mtime changes whenever an entry directly inside it is added,
+    removed or renamed. So each pass stats every known directory, lists only
+    those whose mtime moved (plus any new subtrees), and leaves the rest alone.
+    Files that vanished in one place and appeared in another with the same
+    inode are treated as renames, which keeps their catalog metadata.
+    """
+
+    def __init__(self, catalog: LibraryCatalog, roots: Iterable[str], logger: Optional[logging.Logger] = None,
+                 index=None):
+        self.catalog = catalog
+        self.roots = sorted({os.path.normpath(os.path.abspath(r)) for r in roots if r})
+        self.logger = logger or logging.getLogger("reconciler")
+        self.index = index
+
+    def run(self) -> Dict[str, int]:
+        start = time.monotonic()
+        started = time.time()
+        known = self.catalog.dir_mtimes()
+        dirs: Dict[str, int] = {}
+        gone_dirs: List[str] = []
+        found: Dict[str, Tuple[int, int, int]] = {}  # path -> (size, dev, inode)
+        missing: Dict[str, Tuple[Optional[int], Optional[int]]] = {}  # path -> (dev, inode)
+        listed = 0
+
+        to_list = [root for root in self.roots if root not in known]
+        for path, mtime_ns in known.items():
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                gone_dirs.append(path)
+                continue
+            if current != mtime_ns:
+                to_list.append(path)
+
+        # Whatever was catalogued under a vanished directory is gone from there
+        for path in gone_dirs:
+            missing.update(self.catalog.files_in(path, recursive=True))
+
+        while to_list:
+            directory = to_list.pop()
+            # Catalog read before the listing: a file placed in between shows up as found, never as missing
+            catalogued = self.catalog.files_in(directory)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns  # taken before listing, so a change mid-listing is seen next pass
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            listed += 1
+            dirs[directory] = mtime_ns
+            on_disk = set()
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in known:
+                            to_list.append(entry.path)  # new subtree: walk it all
+                        continue
+                    if not entry.name.lower().endswith(TRACKED_EXTS):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                on_disk.add(entry.path)
+                if catalogued.get(entry.path) != (st.st_dev, st.st_ino):
+                    found[entry.path] = (st.st_size, st.st_dev, st.st_ino)
+            for path, identity in catalogued.items():
+                if path not in on_disk:
+                    missing[path] = identity
+
+        # Same inode gone from one place and found in another: a rename
+        by_inode = {identity: path for path, identity in missing.items() if identity[1] is not None}
+        renamed: List[Tuple[str, str]] = []
+        for path, (size, dev, inode) in list(found.items()):
+            old = by_inode.get((dev, inode))
+            if old and old != path:
+                renamed.append((old, path))
+                del missing[old]
+                del found[path]
+
+        added = [(path, size, dev, inode) for path, (size, dev, inode) in found.items()]
+        removed = list(missing)
+        self.catalog.apply_changes(added, removed, renamed, dirs, gone_dirs, started)
+
+        if self.index:
+            for path in removed + [old for old, _ in renamed]:
+                self.index.remove(path)
+            for path in [new for _, new in renamed] + [path for path, *_ in added]:
+                self.index.add(path)
+
+        stats = {
+            "dirs": len(known), "listed": listed, "added": len(added), "removed": len(removed),
+            "renamed": len(renamed), "gone_dirs": len(gone_dirs)
+        }
+        self.logger.info(
+            f"Reconciled library in {time.monotonic() - start:.2f}s: {stats['dirs']} dirs checked, {listed} listed, "
+            f"+{len(added)} -{len(removed)} ~{len(renamed)} renamed"
+        )
+        return stats
+
+if __name__ == "__main__":
+    # One-off pass, e.g. from a nightly timer while the daemon isn't running
+    from config_loader import load_config
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    config = load_config()
+    catalog = LibraryCatalog(config.catalog_file)
+    Reconciler(catalog, config.tv_dirs + config.movies_dirs + [config.movies_kids_dir, config.music_dir]).run()
+    catalog.close()
@@ -2,13 +2,31 @@ import os
 import time
 import shutil
 import logging
+import functools
 from typing import Callable
 
 from media_parser import (
-    parse_media_title,
-    is_tv_show,
-    get_tv_show_info
+    parse_media,
+    extract_imdb_id,
+    configure_parse_cache,
+    set_fast_path,
+    parse_many
 )
+from media_probe import probe
+from move_engine import MoveInterrupted
+from ingest_manifest import build_manifest, VIDEO_EXTS, AUDIO_EXTS
+from lookup_planner import LookupPlanner
+from artwork_cache import ArtworkCache
+
+MEDIA_EXTS = VIDEO_EXTS + AUDIO_EXTS
+
+# Sidecar text files worth scanning for an IMDb id, and how much of each to read
+INFO_EXTS = (".nfo", ".txt")
+INFO_MAX_FILE_SIZE = 1_000_000
+INFO_READ_BYTES = 64 * 1024
+
+# Scans with at least this many loose media files pre-parse them on a process pool
+PARSE_BATCH_MIN = 200
 
 class MediaScanner:
     def __init__(self, config, logger, omdb, handler):
@@ -30,44 +48,97 @@ class MediaScanner:
 
         self.logger.debug(f"Logger level set to: {log_level_str}")
 
-        self.fuzzy_match_threshold = int(getattr(self.config, "fuzzy_match", 90))
-        self.logger.debug(f"Fuzzy match threshold set to: {self.fuzzy_match_threshold}%")
-
         self.duplicate_dir = getattr(self.config, "duplicate_dir", os.path.join(self.config.uploads_dir, "DUPLICATE"))
 
+        set_fast_path(getattr(self.config, "fast_parse", True))
+        self.parse_cache = configure_parse_cache(
+            getattr(self.config, "parse_cache_file", "") or None,
+            maxsize=getattr(self.config, "parse_cache_size", 4096)
+        )
+
+        self.planner = LookupPlanner(
+            self.omdb,
+            self.logger,
+            cache_path=getattr(self.config, "omdb_cache_file", None),
+            stats_path=getattr(self.config, "lookup_stats_file", None)
+        )
+
+        artwork_dir = getattr(self.config, "artwork_dir", "")
+        self.artwork = ArtworkCache(
+            artwork_dir,
+            self.logger,
+            workers=getattr(self.config, "artwork_workers", 4),
+            timeout=self.config.api_timeout
+        ) if artwork_dir else None
+
     def set_shutdown_callback(self, callback: Callable[[], bool]):
         self._shutdown_callback = callback
+        self.handler.set_shutdown_callback(callback)
 
     def should_shutdown(self):
         return callable(self._shutdown_callback) and self._shutdown_callback()
 
+    def close(self):
+        """Let background stages finish before exit."""
+        self.handler.close()
+        if self.artwork:
+            self.artwork.close()
+        self.logger.debug(f"Parse cache: {self.parse_cache.hits} hits, {self.parse_cache.misses} misses")
+        self.parse_cache.close()
+
     def process_folder(self, folder_path: str):
         if folder_path.startswith(self.duplicate_dir):
             self.logger.debug(f"Skipping DUPLICATE folder: {folder_path}")
             return
 
-        media_exts = (".mkv", ".mp4", ".avi", ".mov", ".flac", ".mp3")
-        media_files = [
-            os.path.join(folder_path, f)
-            for f in os.listdir(folder_path)
-            if f.lower().endswith(media_exts)
-        ]
-
-        if not media_files:
+        manifest = build_manifest(
+            folder_path,
+            include_extras=getattr(self.config, "ingest_extras", False),
+            skip=self.handler.is_processed if self.handler.ledger else None
+        )
+        if not manifest.main and manifest.skipped:
+            # Every feature was linked on earlier passes; only leftovers remain
+            self.handler.dispose_leftovers(manifest)
+            return
+        if not manifest.main:
+            if os.path.abspath(folder_path).startswith(os.path.abspath(self.config.unknown_dir)):
+                self.logger.debug(f"Folder has no media, leaving in UNKNOWN: {folder_path}")
+                return
             self.logger.warning(f"Folder has no media, moving to UNKNOWN: {folder_path}")
             self.handler.move_to_unknown(folder_path)
             return
 
-        # Pick the largest media file as the representative
-        main_media = max(media_files, key=os.path.getsize)
-        self.process_file(main_media, parent_folder=folder_path)
+        imdb_id = self.find_imdb_id(folder_path)
+        # Audio folders (albums) still move as a whole
+        is_video = manifest.main.lower().endswith(VIDEO_EXTS)
+        self.process_file(manifest.main, parent_folder=folder_path, imdb_id=imdb_id,
+                          manifest=manifest if is_video else None)
+
+    def find_imdb_id(self, folder_path: str):
+        """Look for an IMDb id in small .nfo/.txt files shipped with a release."""
+        try:
+            # .nfo files are the authoritative scene source, so check them first
+            info_files = sorted(
+                (e for e in os.scandir(folder_path)
+                 if e.is_file() and e.name.lower().endswith(INFO_EXTS) and e.stat().st_size <= INFO_MAX_FILE_SIZE),
+                key=lambda e: (not e.name.lower().endswith(".nfo"), e.name)
+            )
+            for entry in info_files:
+                with open(entry.path, "rb") as f:
+                    text = f.read(INFO_READ_BYTES).decode("latin-1")
+                imdb_id = extract_imdb_id(text)
+                if imdb_id:
+                    self.logger.info(f"Found IMDb id {imdb_id} in {entry.name}")
+                    return imdb_id
+        except OSError as e:
+            self.logger.debug(f"Could not scan info files in {folder_path}: {str(e)}")
+        return None
 
-    def process_file(self, path: str, parent_folder: str = None):
+    def process_file(self, path: str, parent_folder: str = None, imdb_id: str = None, manifest=None):
         if not os.path.exists(path):
             return
 
-        media_exts = (".mkv", ".mp4", ".avi", ".mov", ".flac", ".mp3")
-        if not path.lower().endswith(media_exts):
+        if not path.lower().endswith(MEDIA_EXTS):
             self.logger.debug(f"Skipping non-media file: {path}")
             return
 
@@ -76,45 +147,78 @@ class MediaScanner:
         self.logger.debug(f"Full path: {path}")
 
         try:
-            title, year = parse_media_title(item_name)
-            is_tv = is_tv_show(item_name)
-            media_info = None
+            parsed = parse_media(item_name)
+            self.logger.debug(f"Parsed: {parsed!r}")
+            title, year, is_tv = parsed.title, parsed.year, parsed.is_tv
+            media_type = "series" if is_tv else "movie"
+            media_info = self.planner.resolve(title, year, media_type=media_type, imdb_id=imdb_id)
+            if not media_info:
+                self.logger.warning(f"No OMDb match for {media_type}: {title}")
+                self.handler.move_to_unknown(parent_folder or path)
+                return
+
+            # Trust OMDb's type over the filename guess when the filename allows it
+            if media_info.get("Type") == "series" and parsed.episode:
+                is_tv = True
+            elif media_info.get("Type") == "movie":
+                is_tv = False
 
             if is_tv:
-                tv_info = get_tv_show_info(item_name) or {}
-                media_info = self.omdb.query(title, year, media_type="series") \
-                              or self.omdb.fuzzy_search(title, media_type="series", threshold=self.fuzzy_match_threshold)
-                if not media_info:
-                    self.logger.warning(f"No OMDb match for series: {title}")
-                    self.handler.move_to_unknown(parent_folder or path)
-                    return
                 media_info.update({
                     "Title": media_info.get("Title", title),
-                    "season": tv_info.get("season", "01"),
-                    "episode": tv_info.get("episode", "01"),
-                    "end_episode": tv_info.get("end_episode")
+                    "season": parsed.season or "01",
+                    "episode": parsed.episode or "01",
+                    "end_episode": parsed.end_episode
                 })
             else:
-                media_info = self.omdb.query(title, year, media_type="movie") \
-                              or self.omdb.fuzzy_search(title, media_type="movie", threshold=self.fuzzy_match_threshold)
-                if not media_info:
-                    self.logger.warning(f"No OMDb match for movie: {title}")
-                    self.handler.move_to_unknown(parent_folder or path)
-                    return
                 media_info.update({
                     "Title": media_info.get("Title", title),
                     "Year": media_info.get("Year", year or "0000")
                 })
 
-            target_path = self.handler.construct_path(item_name, media_info, is_tv)
-            if os.path.exists(target_path):
+            probe_info = probe(path)
+            if probe_info:
+                self.logger.debug(f"Probed: {probe_info!r}")
+                media_info["Probe"] = probe_info.to_dict()
+
+            target_path = self.handler.construct_path(item_name, media_info, is_tv, source_path=path)
+            if parent_folder and not manifest and self.handler.exists(target_path):
+                # Folders moved as a unit (albums) can't be compared file by file
                 self.logger.warning(f"Destination exists, moving to DUPLICATE: {target_path}")
-                self.handler.move_to_duplicate(parent_folder or path)
+                self.handler.move_to_duplicate(parent_folder)
                 return
 
-            final_path = self.handler.move_to_target(parent_folder or path, target_path)
-            if final_path:
-                self.handler.write_sidecar_metadata(final_path, media_info)
+            def publish(target_path: str):
+                # Content checks may hash files, so they run on the move lane rather than in the scan
+                if manifest or not parent_folder:
+                    duplicate = self.handler.find_duplicate(path)
+                    if duplicate:
+                        self.handler.drop_incoming(path, duplicate, parent_folder or path, manifest, identical=True)
+                        return None
+
+                replace = False
+                if self.handler.exists(target_path):
+                    if not self.handler.resolve_collision(path, target_path, parent_folder or path, manifest):
+                        return None
+                    replace = True
+                if manifest:
+                    final_path = self.handler.publish_manifest(manifest, target_path, media_info, replace=replace)
+                else:
+                    final_path = self.handler.move_to_target(parent_folder or path, target_path, media_info, replace=replace)
+                if final_path:
+                    self.handler.write_sidecar_metadata(final_path, media_info)
+                    if self.artwork:
+                        self.artwork.submit(final_path, media_info, is_tv)
+                return final_path
+
+            def reroute():
+                # The chosen root had no room for the copy; placement may now prefer another
+                new_target = self.handler.construct_path(item_name, media_info, is_tv, source_path=path)
+                return new_target, functools.partial(publish, new_target)
+
+            job = self.handler.schedule_move(parent_folder or path, target_path,
+                                             functools.partial(publish, target_path), reroute)
+            job.add_done_callback(lambda f, item=parent_folder or path: self.publish_failed(f, item))
 
         except Exception as e:
             self.logger.error(f"Processing error: {str(e)}")
@@ -122,6 +226,21 @@ class MediaScanner:
 
         time.sleep(0.25)
 
+    def publish_failed(self, future, item_path: str):
+        """A publish job that raised sends its item to UNKNOWN, as a processing error does."""
+        if future.cancelled() or future.exception() is None or isinstance(future.exception(), MoveInterrupted):
+            return
+        self.handler.move_to_unknown(item_path)
+
+    def preparse(self, items):
+        """Warm the parse cache for large backlogs using all cores."""
+        names = [os.path.basename(p) for p in items if p.lower().endswith(MEDIA_EXTS)]
+        if len(names) < PARSE_BATCH_MIN:
+            return
+        start_time = time.time()
+        parse_many(names)
+        self.logger.info(f"Pre-parsed {len(names)} names in {time.time() - start_time:.2f}s")
+
     def scan_directory(self, path: str):
         if not os.path.exists(path):
             self.logger.warning(f"Path not found: {path}")
@@ -132,15 +251,24 @@ class MediaScanner:
             filtered_items = [
                 os.path.join(path, item)
                 for item in all_items
-                if not item.startswith(".") and not any(x in item.lower() for x in ["partial", "@eadir", "unknown", "duplicate"])
+                if not item.startswith(".") and not any(x in item.lower() for x in ["partial", "@eadir", "unknown", "duplicate", "quarantine"])
             ]
 
             self.logger.info(f"Found {len(filtered_items)} items in {path}")
+            self.preparse(filtered_items)
             for full_path in filtered_items:
                 if self.should_shutdown():
                     self.logger.info("Shutdown requested — exiting scan loop.")
                     break
 
+                if self.handler.is_busy(full_path):
+                    self.logger.debug(f"Move already scheduled, skipping: {full_path}")
+                    continue
+
+                if self.handler.is_processed(full_path):
+                    self.logger.debug(f"Already ingested (link mode), skipping: {full_path}")
+                    continue
+
                 if os.path.isdir(full_path):
                     self.logger.debug(f"Processing folder: {full_path}")
                     self.process_folder(full_path)
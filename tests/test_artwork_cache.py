@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artwork_cache import ArtworkCache, POSTER_NAME
+
+POSTER_BYTES = b"\xff\xd8\xff\xe0 not really a jpeg"
+
+class ArtworkCacheTest(unittest.TestCase):
+    """Poster downloads against a local HTTP stand-in for the OMDb image host."""
+
+    def setUp(self):
+        self.hits = []
+        hits = self.hits
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits.append(self.path)
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(POSTER_BYTES)))
+                self.end_headers()
+                self.wfile.write(POSTER_BYTES)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = os.path.join(self.tmp.name, "store")
+        self.library = os.path.join(self.tmp.name, "library")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def _item(self, *parts: str) -> str:
+        path = os.path.join(self.library, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        return path
+
+    def _run(self, submissions):
+        cache = ArtworkCache(self.store, workers=2)
+        for path, metadata, is_tv in submissions:
+            cache.submit(path, metadata, is_tv)
+        cache.close()
+        return cache
+
+    def test_episodes_share_one_download_and_show_poster(self):
+        show = {"imdbID": "tt0000001", "Poster": f"{self.base}/show.jpg"}
+        self._run([
+            (self._item("Show", "Season 01", "Show S01E01.mkv"), show, True),
+            (self._item("Show", "Season 01", "Show S01E02.mkv"), show, True),
+            # Same show under a second folder, listed with another poster URL
+            (self._item("Show (US)", "Season 01", "Show S01E01.mkv"), dict(show, Poster=f"{self.base}/other.jpg"), True),
+        ])
+        self.assertEqual(self.hits, ["/show.jpg"])  # one download per imdbID, whatever the URL
+        for folder in ("Show", "Show (US)"):
+            with open(os.path.join(self.library, folder, POSTER_NAME), "rb") as f:
+                self.assertEqual(f.read(), POSTER_BYTES)
+
+    def test_movies_sharing_a_url_download_once_and_are_hardlinked(self):
+        url = f"{self.base}/poster.jpg"
+        cache = self._run([
+            (self._item("A (2001)", "A (2001).mkv"), {"imdbID": "tt0000002", "Poster": url}, False),
+            (self._item("B (2002)", "B (2002).mkv"), {"imdbID": "tt0000003", "Poster": url}, False),
+        ])
+        self.assertEqual(self.hits, ["/poster.jpg"])
+        blob = cache.index[url]
+        for folder in ("A (2001)", "B (2002)"):
+            self.assertTrue(os.path.samefile(os.path.join(self.library, folder, POSTER_NAME), blob))
+
+    def test_falls_back_to_copy_when_hardlinks_fail(self):
+        url = f"{self.base}/poster.jpg"
+        with mock.patch("artwork_cache.os.link", side_effect=OSError("cross-device link")):
+            cache = self._run([(self._item("A (2001)", "A (2001).mkv"), {"imdbID": "tt0000002", "Poster": url}, False)])
+        poster = os.path.join(self.library, "A (2001)", POSTER_NAME)
+        self.assertFalse(os.path.samefile(poster, cache.index[url]))
+        with open(poster, "rb") as f:
+            self.assertEqual(f.read(), POSTER_BYTES)
+
+    def test_stored_blob_is_reused_across_runs(self):
+        url = f"{self.base}/poster.jpg"
+        self._run([(self._item("A (2001)", "A (2001).mkv"), {"imdbID": "tt0000002", "Poster": url}, False)])
+        self._run([(self._item("C (2003)", "C (2003).mkv"), {"imdbID": "tt0000004", "Poster": url}, False)])
+        self.assertEqual(self.hits, ["/poster.jpg"])
+        self.assertTrue(os.path.exists(os.path.join(self.library, "C (2003)", POSTER_NAME)))
+
+if __name__ == "__main__":
+    unittest.main()
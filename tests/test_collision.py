@@ -0,0 +1,173 @@
+import os
+import sys
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collision
+from collision import compare, IDENTICAL, BETTER, WORSE, AMBIGUOUS
+from content_hash import SAMPLE_BYTES
+from ingest_manifest import build_manifest, subtitle_target
+from media_handler import MediaHandler
+
+def write(path: str, data: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def probed(heights):
+    """Stand-in for media_probe.probe answering from a path -> height map."""
+    return mock.patch.object(collision, "probe", side_effect=lambda path: SimpleNamespace(height=heights.get(path)))
+
+class CompareTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _file(self, name: str, data: bytes) -> str:
+        return write(os.path.join(self.tmp.name, name), data)
+
+    def test_identical_small_files(self):
+        a, b = self._file("a.mkv", b"same bytes"), self._file("b.mkv", b"same bytes")
+        with probed({}) as probe:
+            self.assertEqual(compare(a, b), IDENTICAL)
+            probe.assert_not_called()
+
+    def test_identical_large_files_confirmed_by_full_hash(self):
+        data = os.urandom(3 * SAMPLE_BYTES)
+        self.assertEqual(compare(self._file("a.mkv", data), self._file("b.mkv", data)), IDENTICAL)
+
+    def test_same_size_and_ends_but_different_middle_is_not_identical(self):
+        head, tail = os.urandom(SAMPLE_BYTES), os.urandom(SAMPLE_BYTES)
+        a = self._file("a.mkv", head + b"\x00" * SAMPLE_BYTES + tail)
+        b = self._file("b.mkv", head + b"\x01" * SAMPLE_BYTES + tail)
+        with probed({}):
+            self.assertEqual(compare(a, b), AMBIGUOUS)
+
+    def test_probed_height_decides(self):
+        new, old = self._file("new.mkv", b"new"), self._file("old.mkv", b"old copy")
+        with probed({new: 1080, old: 720}):
+            self.assertEqual(compare(new, old), BETTER)
+        with probed({new: 720, old: 1080}):
+            self.assertEqual(compare(new, old), WORSE)
+        with probed({new: 1040, old: 1080}):  # letterboxed: same resolution class
+            self.assertEqual(compare(new, old), AMBIGUOUS)
+        with probed({new: None, old: 1080}):
+            self.assertEqual(compare(new, old), AMBIGUOUS)
+
+class ResolveCollisionTest(unittest.TestCase):
+    """What MediaHandler does with an upload whose library target already exists."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            handler.close()
+        self.tmp.cleanup()
+
+    def _handler(self, **settings) -> MediaHandler:
+        root = self.tmp.name
+        uploads = os.path.join(root, "uploads")
+        config = SimpleNamespace(
+            uploads_dir=uploads,
+            unknown_dir=os.path.join(uploads, "UNKNOWN"),
+            duplicate_dir=os.path.join(uploads, "DUPLICATE"),
+            quarantine_dir=os.path.join(uploads, "QUARANTINE"),
+            tv_dir=os.path.join(root, "tv"),
+            movies_dir=os.path.join(root, "movies"),
+            ledger_file=os.path.join(root, "processed.db"),
+            catalog_file="",
+            **settings
+        )
+        for path in (config.unknown_dir, config.duplicate_dir, config.tv_dir, config.movies_dir):
+            os.makedirs(path, exist_ok=True)
+        handler = MediaHandler(config, logging.getLogger("test"))
+        self.handlers.append(handler)
+        return handler
+
+    def _release(self, handler, main_data: bytes, subtitle_data: bytes = b"1\n00:00:01,000 --> 00:00:02,000\nnew\n"):
+        folder = os.path.join(handler.config.uploads_dir, "Movie.2020.1080p")
+        write(os.path.join(folder, "Movie.2020.1080p.mkv"), main_data)
+        write(os.path.join(folder, "Movie.2020.1080p.en.srt"), subtitle_data)
+        return folder, build_manifest(folder)
+
+    def _library(self, handler, data: bytes) -> str:
+        target = os.path.join(handler.config.movies_dir, "Movie (2020)", "Movie (2020).mkv")
+        write(target, data)
+        handler.index.add(target)
+        return target
+
+    def test_identical_upload_is_dropped_with_its_sidecars(self):
+        handler = self._handler()
+        target = self._library(handler, b"movie bytes")
+        folder, manifest = self._release(handler, b"movie bytes")
+        self.assertFalse(handler.resolve_collision(manifest.main, target, folder, manifest))
+        self.assertFalse(os.path.exists(folder))
+        parked = [name for _, _, files in os.walk(handler.config.uploads_dir) for name in files]
+        self.assertEqual(parked, [])
+        self.assertTrue(os.path.exists(target))
+
+    def test_lower_resolution_goes_to_duplicate_by_default(self):
+        handler = self._handler()
+        target = self._library(handler, b"old high-res copy")
+        folder, manifest = self._release(handler, b"new low-res")
+        with probed({manifest.main: 720, target: 1080}):
+            self.assertFalse(handler.resolve_collision(manifest.main, target, folder, manifest))
+        self.assertFalse(os.path.exists(folder))
+        parked = os.listdir(handler.config.duplicate_dir)
+        self.assertEqual(len(parked), 1)
+        self.assertIn("Movie.2020.1080p.mkv", os.listdir(os.path.join(handler.config.duplicate_dir, parked[0])))
+
+    def test_lower_resolution_is_dropped_when_configured(self):
+        handler = self._handler(drop_lower_quality=True)
+        target = self._library(handler, b"old high-res copy")
+        folder, manifest = self._release(handler, b"new low-res")
+        with probed({manifest.main: 720, target: 1080}):
+            self.assertFalse(handler.resolve_collision(manifest.main, target, folder, manifest))
+        self.assertFalse(os.path.exists(manifest.main))
+        self.assertEqual(os.listdir(handler.config.duplicate_dir), [])
+
+    def test_ambiguous_goes_to_duplicate(self):
+        handler = self._handler()
+        target = self._library(handler, b"old copy")
+        folder, manifest = self._release(handler, b"other copy")
+        with probed({}):
+            self.assertFalse(handler.resolve_collision(manifest.main, target, folder, manifest))
+        self.assertEqual(len(os.listdir(handler.config.duplicate_dir)), 1)
+
+    def test_upgrade_replaces_main_file_and_sidecars(self):
+        handler = self._handler()
+        target = self._library(handler, b"old low-res")
+        old_subtitle = write(os.path.join(os.path.dirname(target), "Movie (2020).en.srt"), b"old subtitle")
+        handler.index.add(old_subtitle)
+        folder, manifest = self._release(handler, b"new high-res copy", b"new subtitle")
+        self.assertEqual(subtitle_target(manifest.subtitles[0], manifest.main, target), old_subtitle)
+
+        with probed({manifest.main: 1080, target: 720}):
+            self.assertTrue(handler.resolve_collision(manifest.main, target, folder, manifest))
+        self.assertEqual(handler.publish_manifest(manifest, target, {}, replace=True), target)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), b"new high-res copy")
+        with open(old_subtitle, "rb") as f:
+            self.assertEqual(f.read(), b"new subtitle")
+
+    def test_link_mode_relinks_library_file_to_identical_upload(self):
+        handler = self._handler(ingest_mode="link")
+        target = self._library(handler, b"movie bytes")
+        folder, manifest = self._release(handler, b"movie bytes")
+        self.assertFalse(handler.resolve_collision(manifest.main, target, folder, manifest))
+        self.assertTrue(os.path.exists(manifest.main))
+        self.assertTrue(os.path.samefile(manifest.main, target))
+        self.assertTrue(handler.is_processed(manifest.main))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_catalog import LibraryCatalog
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.catalog = LibraryCatalog(os.path.join(self.tmp.name, "library.db"))
+
+    def tearDown(self):
+        self.catalog.close()
+        self.tmp.cleanup()
+
+    def _file(self, name: str, data: bytes = b"x") -> str:
+        path = os.path.join(self.tmp.name, "lib", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _row(self, path: str):
+        return self.catalog._db.execute(
+            "SELECT title, imdb_id, sample_hash, content_hash, method FROM items WHERE path = ?", (path,)
+        ).fetchone()
+
+    def test_record_upserts_and_keeps_known_metadata(self):
+        path = self._file("Movie (2020).mkv")
+        self.catalog.record("/up/a.mkv", path, {"Title": "Movie", "imdbID": "tt0000001"}, 1, "s1", "f1", "copy")
+        self.catalog.record("/up/b.mkv", path, None, 1, "s2", "f2", "rename")
+        self.assertEqual(self._row(path), ("Movie", "tt0000001", "s2", "f2", "rename"))
+        self.assertEqual(self.catalog.summary()["items"], 1)
+        self.assertEqual(self.catalog.find_imdb("tt0000001"), [path])
+
+    def test_files_in_is_a_prefix_scan(self):
+        a = self._file("Show/Season 01/a.mkv")
+        b = self._file("Show/b.mkv")
+        other = self._file("Show 2/c.mkv")
+        for path in (a, b, other):
+            self.catalog.record("", path, None, 1)
+        show = os.path.join(self.tmp.name, "lib", "Show")
+        self.assertEqual(set(self.catalog.files_in(show)), {b})
+        self.assertEqual(set(self.catalog.files_in(show, recursive=True)), {a, b})
+
+    def test_apply_changes_adds_removes_and_renames(self):
+        kept, gone, old = self._file("kept.mkv"), self._file("gone.mkv"), self._file("old.mkv")
+        for path in (kept, gone, old):
+            self.catalog.record("", path, {"Title": os.path.basename(path)}, 1, "s", "f")
+        new = os.path.join(os.path.dirname(old), "new.mkv")
+        os.rename(old, new)
+        found = self._file("found.mkv")
+        st = os.stat(found)
+
+        self.catalog.apply_changes([(found, 1, st.st_dev, st.st_ino)], [gone], [(old, new)],
+                                   {"/lib": 1}, [], time.time())
+        self.assertIsNone(self._row(gone))
+        self.assertIsNone(self._row(old))
+        self.assertEqual(self._row(new)[0], "old.mkv")  # metadata follows the rename
+        self.assertEqual(self._row(found), (None, None, None, None, "found"))
+        self.assertEqual(self._row(kept)[2:4], ("s", "f"))
+        self.assertEqual(self.catalog.dir_mtimes(), {"/lib": 1})
+
+    def test_apply_changes_clears_hashes_only_when_the_inode_changed(self):
+        path = self._file("a.mkv")
+        self.catalog.record("", path, None, 1, "s", "f")
+        st = os.stat(path)
+        self.catalog.apply_changes([(path, 1, st.st_dev, st.st_ino)], [], [], {}, [], time.time())
+        self.assertEqual(self._row(path)[2:4], ("s", "f"))
+        self.catalog.apply_changes([(path, 1, st.st_dev, st.st_ino + 1)], [], [], {}, [], time.time())
+        self.assertEqual(self._row(path)[2:4], (None, None))
+
+    def test_rows_written_during_a_pass_are_left_alone(self):
+        started = time.time()
+        time.sleep(0.01)
+        placed, moved = self._file("placed.mkv"), self._file("moved.mkv")
+        self.catalog.record("", placed, None, 1, "s", "f")  # published while the pass was listing
+        self.catalog.record("", moved, None, 1, "s", "f")
+        self.catalog.apply_changes([], [placed], [(moved, moved + ".renamed")], {}, [], started)
+        self.assertIsNotNone(self._row(placed))
+        self.assertIsNotNone(self._row(moved))
+        self.assertIsNone(self._row(moved + ".renamed"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import logging
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_handler import MediaHandler
+
+class LinkModeSourceTest(unittest.TestCase):
+    """Link mode keeps seeding uploads in place but moves items parked under uploads."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        uploads = os.path.join(root, "uploads")
+        self.config = SimpleNamespace(
+            uploads_dir=uploads,
+            unknown_dir=os.path.join(uploads, "UNKNOWN"),
+            duplicate_dir=os.path.join(uploads, "DUPLICATE"),
+            quarantine_dir=os.path.join(uploads, "QUARANTINE"),
+            tv_dir=os.path.join(root, "tv"),
+            movies_dir=os.path.join(root, "movies"),
+            ingest_mode="link",
+            ledger_file=os.path.join(root, "processed.db"),
+            catalog_file="",
+            reconcile_interval=0,
+        )
+        for path in (self.config.unknown_dir, self.config.tv_dir, self.config.movies_dir):
+            os.makedirs(path)
+        self.handler = MediaHandler(self.config, logging.getLogger("test"))
+
+    def tearDown(self):
+        self.handler.close()
+        self.tmp.cleanup()
+
+    def _upload(self, directory: str, name: str) -> str:
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * 1024)
+        return path
+
+    def test_upload_is_linked_and_recorded(self):
+        source = self._upload(self.config.uploads_dir, "Movie.2020.mkv")
+        target = os.path.join(self.config.movies_dir, "Movie (2020)", "Movie (2020).mkv")
+        self.handler.transfer(source, target)
+        self.assertTrue(os.path.exists(source))
+        self.assertTrue(os.path.samefile(source, target))
+        self.assertTrue(self.handler.is_processed(source))
+
+    def test_unknown_rescan_is_moved_not_linked(self):
+        for parked in (self.config.unknown_dir, self.config.duplicate_dir, self.config.quarantine_dir):
+            self.assertFalse(self.handler.keeps_source(os.path.join(parked, "Movie.2020.mkv")))
+
+        source = self._upload(self.config.unknown_dir, "Movie.2020.mkv")
+        target = os.path.join(self.config.movies_dir, "Movie (2020)", "Movie (2020).mkv")
+        self.handler.transfer(source, target)
+        self.assertFalse(os.path.exists(source))
+        self.assertTrue(os.path.exists(target))
+        self.assertFalse(self.handler.is_processed(source))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import errno
+import logging
+import time
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import xxhash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import move_engine
+import move_scheduler
+from move_engine import MoveEngine
+from move_scheduler import MoveScheduler
+
+def refuse_across_mounts(source_path: str):
+    """os.rename/os.link stand-ins that fail like a bind-mount boundary for one source."""
+    rename, link = os.rename, os.link
+
+    def fake_rename(src, dst, *args, **kwargs):
+        if src == source_path:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return rename(src, dst, *args, **kwargs)
+
+    def fake_link(src, dst, *args, **kwargs):
+        if src == source_path:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return link(src, dst, *args, **kwargs)
+
+    return mock.patch.multiple(move_engine.os, rename=fake_rename, link=fake_link)
+
+class CrossMountTest(unittest.TestCase):
+    """Same st_dev doesn't guarantee rename() works; EXDEV falls back to a copy."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "Movie.2020.mkv")
+        self.target = os.path.join(self.tmp.name, "movies", "Movie (2020).mkv")
+        with open(self.source, "wb") as f:
+            f.write(os.urandom(64 * 1024))
+        self.engine = MoveEngine(logging.getLogger("test"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_rename_exdev_copies(self):
+        with open(self.source, "rb") as f:
+            data = f.read()
+        with refuse_across_mounts(self.source):
+            result = self.engine.move(self.source, self.target)
+        self.assertNotEqual(result.method, "rename")
+        self.assertFalse(os.path.exists(self.source))
+        with open(self.target, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_link_exdev_copies_and_keeps_source(self):
+        with refuse_across_mounts(self.source):
+            result = self.engine.move(self.source, self.target, keep_source=True)
+        self.assertNotEqual(result.method, "hardlink")
+        self.assertTrue(os.path.exists(self.source))
+        self.assertFalse(os.path.samefile(self.source, self.target))
+
+    def test_copies_are_hashed_by_default(self):
+        with open(self.source, "rb") as f:
+            digest = xxhash.xxh64(f.read()).hexdigest()
+        os.makedirs(os.path.dirname(self.target))
+        result = self.engine.move_file(self.source, self.target)
+        if result.method != "reflink":
+            self.assertEqual(result.hashes.get("xxh64"), digest)
+
+    def test_fast_lane_job_is_requeued_as_copy(self):
+        scheduler = MoveScheduler(logging.getLogger("test"))
+        self.engine.before_copy = scheduler.before_copy
+        lanes = []
+
+        def work():
+            lanes.append(threading.current_thread().name)
+            return self.engine.move(self.source, self.target)
+
+        try:
+            with refuse_across_mounts(self.source):
+                result = scheduler.submit(self.source, self.target, work).result(timeout=10)
+        finally:
+            scheduler.close()
+        device = os.stat(self.tmp.name).st_dev
+        self.assertEqual(len(lanes), 2)
+        self.assertTrue(lanes[0].startswith("move-fast"))
+        self.assertTrue(lanes[1].startswith(f"move-{device}-{device}"))
+        self.assertNotEqual(result.method, "rename")
+        self.assertFalse(os.path.exists(move_engine.partial_path(self.target)))
+        self.assertFalse(scheduler.is_busy(self.source))
+
+class ReflinkLaneTest(unittest.TestCase):
+    """Clone-capable pairs skip copy policy up front and only pay it when the clone falls back."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, "pool-a", "Movie.2020.mkv")
+        self.target = os.path.join(self.tmp.name, "pool-b", "Movie (2020).mkv")
+        os.makedirs(os.path.dirname(self.source))
+        with open(self.source, "wb") as f:
+            f.write(b"x" * 4096)
+        # Everything is held for an off-peak window that never opens
+        policy = SimpleNamespace(defer_above=1, should_defer=lambda size: True, in_offpeak=lambda: False)
+        self.scheduler = MoveScheduler(logging.getLogger("test"), policy=policy, may_clone=lambda src, dst: True)
+        devices = mock.patch.object(move_scheduler, "device_of",
+                                    side_effect=lambda path: 1 if "pool-a" in path else 2)
+        devices.start()
+        self.addCleanup(devices.stop)
+
+    def tearDown(self):
+        self.scheduler.close()
+        self.tmp.cleanup()
+
+    def test_clone_is_not_deferred(self):
+        job = self.scheduler.submit(self.source, self.target, lambda: "cloned")
+        self.assertEqual(job.result(timeout=10), "cloned")
+
+    def test_clone_fallback_is_deferred(self):
+        def work():
+            self.scheduler.before_copy(self.source)  # what the engine does once FICLONE is refused
+            return "copied"
+
+        job = self.scheduler.submit(self.source, self.target, work)
+        deadline = time.monotonic() + 10
+        while "deferred" not in self.scheduler.status() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.scheduler.status().get("deferred"), 1)
+        self.assertFalse(job.done())
+        self.assertTrue(self.scheduler.is_busy(self.source))
+
+    def test_refused_pair_goes_to_device_lane(self):
+        self.scheduler.may_clone = lambda src, dst: False
+        self.scheduler.submit(self.source, self.target, lambda: "copied")
+        self.assertEqual(self.scheduler.status().get("deferred"), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import errno
+import logging
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import move_scheduler
+from move_scheduler import MoveScheduler
+
+class AdmissionTest(unittest.TestCase):
+    """Copies are admitted against free space less reservations, and otherwise wait or re-route."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pools = {}
+        for pool in ("pool-a", "pool-b", "pool-c"):
+            self.pools[pool] = os.path.join(self.tmp.name, pool)
+            os.makedirs(self.pools[pool])
+        self.source = os.path.join(self.pools["pool-a"], "Movie.2020.mkv")
+        with open(self.source, "wb") as f:
+            f.write(b"x" * 4096)
+        self.target = os.path.join(self.pools["pool-b"], "Movie (2020).mkv")
+
+        self.free = {1: 10 ** 9, 2: 10 ** 9, 3: 10 ** 9}
+        device = lambda path: 1 if "pool-a" in path else 3 if "pool-c" in path else 2
+        for name, fake in (("device_of", device), ("free_bytes", lambda path: self.free[device(path)])):
+            patcher = mock.patch.object(move_scheduler, name, side_effect=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.scheduler = MoveScheduler(logging.getLogger("test"), min_free=100)
+
+    def tearDown(self):
+        self.scheduler.close()
+        self.tmp.cleanup()
+
+    def _wake(self):
+        self.scheduler._space_changed.set()
+
+    def test_reserve_accounting(self):
+        self.free[2] = 1000
+        self.assertEqual(self.scheduler._reserve(self.target, 500), (2, True))
+        self.assertEqual(self.scheduler.reserved(2), 500)
+        # 1000 free - 500 reserved - 100 margin leaves room for 400, not 401
+        self.assertEqual(self.scheduler._reserve(self.target, 401), (2, False))
+        self.assertEqual(self.scheduler._reserve(self.target, 400), (2, True))
+        self.assertEqual(self.scheduler.reserved(2), 900)
+        self.scheduler._unreserve(2, 500)
+        self.assertEqual(self.scheduler.reserved(2), 400)
+        self.scheduler._unreserve(2, 400)
+        self.assertEqual(self.scheduler.reserved(2), 0)
+        self.assertNotIn(2, self.scheduler._reserved)
+
+    def test_reservation_released_when_job_ends(self):
+        job = self.scheduler.submit(self.source, self.target, lambda: self.scheduler.reserved(2))
+        self.assertEqual(job.result(timeout=10), 4096)
+        self.assertEqual(self.scheduler.reserved(2), 0)
+
+    def test_copy_waits_for_space(self):
+        self.free[2] = 0
+        job = self.scheduler.submit(self.source, self.target, lambda: "copied")
+        self.assertFalse(job.done())
+        self.assertTrue(self.scheduler.is_busy(self.source))
+        status = self.scheduler.status()
+        self.assertEqual(status["waiting_space"], 1)
+        self.assertEqual(status["waiting_space_bytes"], 4096)
+
+        # Space freed from outside (nothing else was reserved on the device)
+        self.free[2] = 10 ** 9
+        self._wake()
+        self.assertEqual(job.result(timeout=10), "copied")
+        self.assertNotIn("waiting_space", self.scheduler.status())
+
+    def test_gives_up_after_waiting(self):
+        self.free[2] = 0
+        with mock.patch.object(move_scheduler, "SPACE_WAIT_SECONDS", 0):
+            job = self.scheduler.submit(self.source, self.target, lambda: "copied")
+            self._wake()
+            error = job.exception(timeout=10)
+        self.assertEqual(error.errno, errno.ENOSPC)
+        self.assertFalse(self.scheduler.is_busy(self.source))
+
+    def test_larger_than_disk_fails_at_once(self):
+        self.free[2] = 0
+        with mock.patch.object(MoveScheduler, "_capacity", return_value=1000):
+            job = self.scheduler.submit(self.source, self.target, lambda: "copied")
+        self.assertEqual(job.exception(timeout=1).errno, errno.ENOSPC)
+
+    def test_rerouted_to_root_with_room(self):
+        self.free[2] = 0
+        other = os.path.join(self.pools["pool-c"], "Movie (2020).mkv")
+        job = self.scheduler.submit(self.source, self.target, lambda: self.target,
+                                    reroute=lambda: (other, lambda: other))
+        self.assertEqual(job.result(timeout=10), other)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omdb_client import OMDbClient, HEDGE_WARMUP_SAMPLES
+
+def stub_server(title: str, delay: float):
+    """Local OMDb stand-in answering every request with `title` after `delay` seconds."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(delay)
+            body = json.dumps({"Response": "True", "Title": title, "imdbID": "tt0000001"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/", hits
+
+class HedgeTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _stub(self, title: str, delay: float):
+        server, url, hits = stub_server(title, delay)
+        self.servers.append(server)
+        return url, hits
+
+    def _client(self, primary: str, secondary: str = None) -> OMDbClient:
+        client = OMDbClient("key", primary, timeout=5, hedge_min_delay=0.05, secondary_url=secondary)
+        # Past warm-up with fast history, so the hedge fires at hedge_min_delay
+        client.response_latencies.extend([0.01] * HEDGE_WARMUP_SAMPLES)
+        return client
+
+    def test_slow_primary_is_hedged_and_first_answer_wins(self):
+        primary, primary_hits = self._stub("Slow", 1.0)
+        secondary, secondary_hits = self._stub("Fast", 0.0)
+        client = self._client(primary, secondary)
+
+        start = time.monotonic()
+        result = client.query_by_id("tt0000001")
+        self.assertEqual(result["Title"], "Fast")
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(client.hedged_count, 1)
+        self.assertEqual((len(primary_hits), len(secondary_hits)), (1, 1))
+
+    def test_fast_primary_is_not_hedged(self):
+        primary, _ = self._stub("Primary", 0.0)
+        secondary, secondary_hits = self._stub("Secondary", 0.0)
+        client = self._client(primary, secondary)
+        self.assertEqual(client.query_by_id("tt0000001")["Title"], "Primary")
+        self.assertEqual(client.hedged_count, 0)
+        self.assertEqual(secondary_hits, [])
+
+    def test_single_provider_never_hedges(self):
+        primary, primary_hits = self._stub("Only", 0.3)
+        client = self._client(primary)
+        self.assertIsNone(client.hedge_delay())
+        self.assertEqual(client.query_by_id("tt0000001")["Title"], "Only")
+        self.assertEqual(client.hedged_count, 0)
+        self.assertEqual(len(primary_hits), 1)
+
+if __name__ == "__main__":
+    unittest.main()
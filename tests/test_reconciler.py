@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_catalog import LibraryCatalog
+from reconciler import Reconciler
+
+class ReconcilerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "lib")
+        self.catalog = LibraryCatalog(os.path.join(self.tmp.name, "library.db"))
+        self.reconciler = Reconciler(self.catalog, [self.root])
+        self._file("Show/Season 01/e1.mkv")
+        self._file("Movie (2020)/Movie (2020).mp4")
+        self._file("Movie (2020)/notes.txt")
+
+    def tearDown(self):
+        self.catalog.close()
+        self.tmp.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _file(self, name: str) -> str:
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(name.encode())
+        return path
+
+    def _touch_dirs(self, *names: str):
+        # Directory mtimes can share a timestamp with the previous pass; force a change
+        for name in names:
+            st = os.stat(self._path(name))
+            os.utime(self._path(name), ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    def _catalogued(self):
+        return set(self.catalog.files_in(self.root, recursive=True))
+
+    def test_first_pass_walks_everything_then_nothing(self):
+        stats = self.reconciler.run()
+        self.assertEqual((stats["listed"], stats["added"]), (4, 2))
+        self.assertEqual(self._catalogued(), {self._path("Show/Season 01/e1.mkv"), self._path("Movie (2020)/Movie (2020).mp4")})
+        stats = self.reconciler.run()
+        self.assertEqual((stats["listed"], stats["added"], stats["removed"]), (0, 0, 0))
+
+    def test_rename_is_matched_by_inode_and_keeps_metadata(self):
+        self.reconciler.run()
+        old = self._path("Movie (2020)/Movie (2020).mp4")
+        self.catalog.set_hashes(old, "sample", "full")
+        new = self._path("Show/Movie (2020).mp4")
+        os.rename(old, new)
+        self._touch_dirs("Movie (2020)", "Show")
+
+        stats = self.reconciler.run()
+        self.assertEqual((stats["renamed"], stats["added"], stats["removed"]), (1, 0, 0))
+        self.assertEqual(self.catalog.by_size(os.path.getsize(new)), [(new, "sample", "full")])
+
+    def test_removed_file_and_vanished_directory(self):
+        self.reconciler.run()
+        self._file("Other/Season 01/x.mkv")
+        self._touch_dirs("")
+        self.reconciler.run()
+        shutil.rmtree(self._path("Other"))
+        os.unlink(self._path("Show/Season 01/e1.mkv"))
+        self._touch_dirs("", "Show/Season 01")
+
+        stats = self.reconciler.run()
+        self.assertEqual(stats["removed"], 2)
+        self.assertEqual(stats["gone_dirs"], 2)
+        self.assertEqual(self._catalogued(), {self._path("Movie (2020)/Movie (2020).mp4")})
+
+    def test_file_placed_and_recorded_mid_pass_keeps_its_hashes(self):
+        self.reconciler.run()
+        placed = self._file("Show/Season 01/e2.mkv")
+        self._touch_dirs("Show/Season 01")
+        # Publisher records the file (with hashes) after the directory was listed
+        original = self.catalog.files_in
+
+        def files_in(directory, recursive=False):
+            rows = original(directory, recursive)
+            if directory == self._path("Show/Season 01"):
+                self.catalog.record("", placed, {"Title": "Show"}, os.path.getsize(placed), "sample", "full")
+            return rows
+
+        self.catalog.files_in = files_in
+        self.reconciler.run()
+        self.assertIn((placed, "sample", "full"), self.catalog.by_size(os.path.getsize(placed)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+from media_parser_dedupe import parse_title_year
+
+# The main application's parser lives one directory up
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import media_parser
+
+# Argument Parsing
+parser = argparse.ArgumentParser(description="Parser speed and accuracy benchmark")
+parser.add_argument('-c', '--corpus', default=str(Path(__file__).resolve().parent / 'parser_corpus.json'), help='Labelled corpus JSON file')
+parser.add_argument('-r', '--repeat', type=int, default=5, help='Timed passes over the corpus per parser')
+parser.add_argument('-p', '--parsers', default='tiered,guessit,dedupe', help='Comma-separated parsers to run (tiered, guessit, dedupe)')
+parser.add_argument('-j', '--json', action='store_true', help='Output results in JSON format')
+args = parser.parse_args()
+
+with open(args.corpus, 'r', encoding='utf-8') as f:
+    corpus = json.load(f)['entries']
+
+def parse_main(name):
+    return media_parser.parse_media(name).to_dict()
+
+def parse_dedupe(name):
+    title, year = parse_title_year(name)
+    return {'title': title, 'year': year}
+
+PARSERS = {
+    # Parse cache disabled (maxsize 0) so every call does the real work
+    'tiered': (parse_main, lambda: (media_parser.set_fast_path(True), media_parser.configure_parse_cache(None, maxsize=0))),
+    'guessit': (parse_main, lambda: (media_parser.set_fast_path(False), media_parser.configure_parse_cache(None, maxsize=0))),
+    'dedupe': (parse_dedupe, lambda: None),
+}
+
+def normalize(value):
+    return ' '.join(str(value).replace('.', ' ').split()).lower() if value not in (None, '') else None
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def score(parse):
+    """Field-level accuracy, counting only fields the parser produces and the label defines."""
+    fields = {}
+    for entry in corpus:
+        result = parse(entry['name'])
+        for field, expected in entry['expected'].items():
+            if field not in result:
+                continue
+            stats = fields.setdefault(field, {'correct': 0, 'total': 0})
+            stats['total'] += 1
+            if normalize(result[field]) == normalize(expected):
+                stats['correct'] += 1
+    return {field: round(s['correct'] / s['total'], 3) for field, s in sorted(fields.items())}
+
+def measure(parse):
+    names = [entry['name'] for entry in corpus]
+    parse(names[0])  # build lazy rule tables outside the timed region
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for name in names:
+            t0 = time.perf_counter_ns()
+            parse(name)
+            latencies.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - start
+
+    # Separate untimed pass so tracing overhead does not skew latency
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for name in names:
+        parse(name)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    return {
+        'names_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_us': round(percentile(latencies, 50) / 1000, 1),
+        'p99_us': round(percentile(latencies, 99) / 1000, 1),
+        'retained_blocks_per_name': round(allocated / len(names), 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+# Main logic
+results = {}
+for key in [p.strip() for p in args.parsers.split(',') if p.strip()]:
+    parse, setup = PARSERS[key]
+    setup()
+    results[key] = dict(measure(parse), accuracy=score(parse))
+
+if args.json:
+    print(json.dumps({'corpus_size': len(corpus), 'results': results}, indent=2))
+else:
+    print(f"Corpus: {len(corpus)} names, {args.repeat} timed passes")
+    for key, r in results.items():
+        print(f"\n[{key}]")
+        print(f"  {r['names_per_sec']} names/sec  p50 {r['p50_us']}us  p99 {r['p99_us']}us")
+        print(f"  peak {r['peak_kb']} KB  retained blocks/name {r['retained_blocks_per_name']}")
+        print("  accuracy: " + ", ".join(f"{field}={acc:.1%}" for field, acc in r['accuracy'].items()))